@@ -0,0 +1,93 @@
+"""
+Per-user cache of attempted question IDs, used by /sessions to prefer
+questions the user has not seen yet.
+
+Each user's attempts are kept as a bitmap over question IDs, loaded from the
+database once and then updated in place by /attempts.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import models
+
+MAX_USERS = 10000
+# Entries are reloaded after this many seconds so attempts written by other
+# workers eventually show up.
+ENTRY_TTL = 300.0
+
+
+class AttemptedSet:
+    """
+    Bitmap over question IDs (one bit per ID).
+    """
+    __slots__ = ("bits", "count", "loaded_at")
+
+    def __init__(self, question_ids=()):
+        self.bits = bytearray()
+        self.count = 0
+        self.loaded_at = time.monotonic()
+        for question_id in question_ids:
+            self.add(question_id)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, question_id):
+        byte = question_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (question_id & 7)))
+
+    def add(self, question_id):
+        byte = question_id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte - len(self.bits) + 1))
+        mask = 1 << (question_id & 7)
+        if not self.bits[byte] & mask:
+            self.bits[byte] |= mask
+            self.count += 1
+
+
+class AttemptCache:
+    def __init__(self, max_users=MAX_USERS):
+        self._lock = threading.Lock()
+        self._sets = OrderedDict()  # user_id -> AttemptedSet, in LRU order
+        self.max_users = max_users
+
+    def get(self, db, user_id):
+        with self._lock:
+            attempted = self._sets.get(user_id)
+            if attempted is not None and time.monotonic() - attempted.loaded_at < ENTRY_TTL:
+                self._sets.move_to_end(user_id)
+                return attempted
+
+        rows = db.query(models.Attempt.question_id).filter(
+            models.Attempt.user_id == user_id
+        ).distinct().all()
+        loaded = AttemptedSet(row[0] for row in rows if row[0] is not None)
+
+        with self._lock:
+            self._sets[user_id] = loaded
+            self._sets.move_to_end(user_id)
+            while len(self._sets) > self.max_users:
+                self._sets.popitem(last=False)
+        return loaded
+
+    def record(self, user_id, question_id):
+        """
+        Mark a question as attempted. Users not in the cache are skipped; their
+        set is loaded from the database on next use.
+        """
+        with self._lock:
+            attempted = self._sets.get(user_id)
+            if attempted is not None:
+                attempted.add(question_id)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._sets.clear()
+            else:
+                self._sets.pop(user_id, None)
+
+
+cache = AttemptCache()
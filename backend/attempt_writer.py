@@ -0,0 +1,222 @@
+"""
+Group commit for attempts.
+
+When enabled, POST /attempts and /attempts/bulk hand their rows to a single
+background task that commits everything that arrived within a short window
+(or up to a row limit) in one transaction. Each request still waits for the
+commit that contains its rows, so an acknowledged attempt is always durable;
+what is saved is the per-request fsync.
+
+Configure with MATH_ATTEMPT_WRITE_BEHIND=1, MATH_ATTEMPT_FLUSH_INTERVAL_MS and
+MATH_ATTEMPT_FLUSH_MAX_ROWS.
+"""
+import asyncio
+import os
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+import attempt_cache
+import models
+import user_stats
+from database import AsyncSessionLocal
+
+WRITE_BEHIND = os.environ.get("MATH_ATTEMPT_WRITE_BEHIND", "0") == "1"
+FLUSH_INTERVAL_MS = int(os.environ.get("MATH_ATTEMPT_FLUSH_INTERVAL_MS", 25))
+FLUSH_MAX_ROWS = int(os.environ.get("MATH_ATTEMPT_FLUSH_MAX_ROWS", 500))
+
+
+async def insert_attempts(db, rows):
+    """
+    Insert attempt rows (dicts matching schemas.AttemptCreate) in a single
+    transaction and return them with their question loaded.
+    """
+    return await load_attempts(db, await commit_attempts(db, rows))
+
+
+async def commit_attempts(db, rows):
+    """
+    Insert attempt rows in a single transaction and return their IDs.
+    """
+    db_attempts = [models.Attempt(**row) for row in rows]
+    db.add_all(db_attempts)
+    await user_stats.apply_attempts(db, db_attempts)
+    await db.commit()
+
+    for a in db_attempts:
+        attempt_cache.cache.record(a.user_id, a.question_id)
+    return [a.id for a in db_attempts]
+
+
+async def load_attempts(db, ids):
+    """
+    The attempts with the given IDs, in that order, with their question loaded.
+    """
+    result = await db.scalars(
+        select(models.Attempt)
+        .options(selectinload(models.Attempt.question))
+        .where(models.Attempt.id.in_(ids))
+        .execution_options(populate_existing=True)
+    )
+    by_id = {a.id: a for a in result}
+    return [by_id[i] for i in ids]
+
+
+class AttemptWriter:
+    def __init__(self, session_factory, flush_interval_ms=FLUSH_INTERVAL_MS, max_rows=FLUSH_MAX_ROWS):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_rows = max_rows
+        self._pending = []  # (rows, future) per request
+        self._pending_rows = 0
+        self._wakeup = None
+        self._full = None
+        self._task = None
+        self._closing = False
+
+        # Metrics
+        self.flushes = 0
+        self.rows_written = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.max_batch_rows = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._closing
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop accepting rows and flush everything already queued.
+        """
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        self._full.set()
+        await self._task
+        self._task = None
+
+    async def submit(self, rows):
+        """
+        Queue rows and wait until the transaction containing them commits.
+        """
+        if not self.running:
+            raise RuntimeError("Attempt writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((rows, future))
+        self._pending_rows += len(rows)
+        self._wakeup.set()
+        if self._pending_rows >= self.max_rows:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            if self._closing and not self._pending:
+                return
+            await self._wakeup.wait()
+
+            # Give concurrent requests a short window to join this commit
+            if not self._closing and self._pending_rows < self.max_rows:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._pending
+            self._pending = []
+            self._pending_rows = 0
+            if not self._closing:
+                # Once closing, stay awake so the loop drains and returns
+                self._wakeup.clear()
+                self._full.clear()
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch):
+        rows = [row for request_rows, _ in batch for row in request_rows]
+        start = time.perf_counter()
+        try:
+            async with self.session_factory() as db:
+                try:
+                    ids = await commit_attempts(db, rows)
+                except Exception:
+                    committed = False
+                else:
+                    committed = True
+                    written = await load_attempts(db, ids)
+        except Exception as e:
+            # Committed, but reading the rows back failed: retrying would
+            # insert them twice
+            self._finish(start)
+            self.rows_written += len(rows)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if not committed:
+            self.failed_flushes += 1
+            # Fall back to one transaction per request so a bad row only
+            # fails its own request
+            for request_rows, future in batch:
+                try:
+                    async with self.session_factory() as db:
+                        ids = await commit_attempts(db, request_rows)
+                        self.rows_written += len(request_rows)
+                        written = await load_attempts(db, ids)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(written)
+            self._finish(start)
+            return
+
+        self._finish(start)
+        self.rows_written += len(rows)
+        self.max_batch_rows = max(self.max_batch_rows, len(rows))
+        offset = 0
+        for request_rows, future in batch:
+            if not future.done():
+                future.set_result(written[offset:offset + len(request_rows)])
+            offset += len(request_rows)
+
+    def _finish(self, start):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+
+    def metrics(self):
+        return {
+            "enabled": self.running,
+            "queue_depth": self._pending_rows,
+            "queued_requests": len(self._pending),
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "rows_written": self.rows_written,
+            "max_batch_rows": self.max_batch_rows,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "flush_max_rows": self.max_rows,
+        }
+
+
+writer = AttemptWriter(AsyncSessionLocal)
@@ -0,0 +1,192 @@
+"""
+Throughput benchmark for the async database path versus the previous sync
+(threadpool) endpoints.
+
+The apps run in-process behind httpx's ASGI transport, so no server is
+needed and the only difference is how the endpoints touch the database:
+
+    sync           the endpoints as they were before the async path, on the
+                   engine they used (default pool of 5 + 10 overflow)
+    sync-nullpool  the same endpoints without connection pooling
+    sync-eager     sync-nullpool, with history loading each attempt's
+                   question in one query as the async path does
+    async          the current app
+
+sync is not run by default: with many clients it stalls on 30 s pool
+timeouts, so give it few requests. Run from the backend directory against
+an imported database:
+
+    python bench_concurrency.py --clients 200 --requests 4000
+    python bench_concurrency.py --clients 200 --requests 400 --variants sync
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List, Optional
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, selectinload, sessionmaker
+from sqlalchemy.pool import NullPool
+
+import attempt_cache
+import main
+import models
+import question_index
+import schemas
+from database import SQLALCHEMY_DATABASE_URL
+
+
+def build_sync_app(pool=True, eager_history=False):
+    """
+    The sync versions of the hot endpoints, as they were before the async
+    path. They run in Starlette's threadpool.
+
+    With the default pool and many clients, requests waiting for a
+    connection take every worker thread while finished requests still hold
+    their connections until a worker is free to close the session, so the
+    run can stall on pool timeouts. pool=False shows the same endpoints
+    without that failure mode. eager_history=True loads history as the
+    async endpoint does, to separate that change from the async driver.
+    """
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **({} if pool else {"poolclass": NullPool}),
+    )
+    SyncSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+
+    @app.post("/sessions", response_model=List[schemas.Question])
+    def create_session(session_config: schemas.SessionCreate, db: Session = Depends(get_db)):
+        index = question_index.index
+        index.sync(db)
+        attempted = None
+        if session_config.user_id:
+            attempted = attempt_cache.cache.get(db, session_config.user_id)
+        ids = index.sample(
+            session_config.limit,
+            exclude=attempted,
+            source=session_config.source,
+            difficulty_min=session_config.difficulty_min,
+            difficulty_max=session_config.difficulty_max,
+        )
+        return question_index.fetch_questions(db, ids)
+
+    @app.get("/questions/olympiad", response_model=List[schemas.Question])
+    def get_olympiad_questions(limit: int = 20, source: Optional[str] = None, db: Session = Depends(get_db)):
+        index = question_index.index
+        index.sync(db)
+        return question_index.fetch_questions(db, index.sample(limit, source=source))
+
+    @app.get("/users/{user_id}/history", response_model=list[schemas.Attempt])
+    def get_user_history(user_id: int, db: Session = Depends(get_db)):
+        query = db.query(models.Attempt)
+        if eager_history:
+            query = query.options(selectinload(models.Attempt.question))
+        # Otherwise Attempt.question is lazy-loaded while the response is serialized
+        return query.filter(models.Attempt.user_id == user_id).all()
+
+    @app.post("/attempts", response_model=schemas.Attempt)
+    def create_attempt(attempt: schemas.AttemptCreate, db: Session = Depends(get_db)):
+        db_attempt = models.Attempt(**attempt.dict())
+        db.add(db_attempt)
+        db.commit()
+        db.refresh(db_attempt)
+        attempt_cache.cache.record(db_attempt.user_id, db_attempt.question_id)
+        return db_attempt
+
+    return app
+
+
+def make_request(client, i, args):
+    kind = i % 3
+    if args.writes and i % 10 == 0:
+        return client.post("/attempts", json={
+            "user_id": args.user_id,
+            "question_id": 1,
+            "selected_option": "A",
+            "is_correct": False,
+        })
+    if kind == 0:
+        return client.post("/sessions", json={"limit": 10, "user_id": args.user_id})
+    if kind == 1:
+        return client.get("/questions/olympiad", params={"limit": 20})
+    return client.get(f"/users/{args.user_id}/history")
+
+
+async def run(app, args):
+    # Count server errors (e.g. pool timeouts) instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    latencies = []
+    errors = 0
+    pending = iter(range(args.requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker():
+            nonlocal errors
+            for i in pending:
+                start = time.perf_counter()
+                response = await make_request(client, i, args)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+
+        # Warm up the question index and attempt cache
+        await make_request(client, 0, args)
+        await make_request(client, 1, args)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.clients)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+VARIANTS = {
+    "sync": build_sync_app,
+    "sync-nullpool": lambda: build_sync_app(pool=False),
+    "sync-eager": lambda: build_sync_app(pool=False, eager_history=True),
+    "async": lambda: main.app,
+}
+DEFAULT_VARIANTS = ["sync-nullpool", "sync-eager", "async"]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--writes", action="store_true", help="mix in POST /attempts (10%% of requests)")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=DEFAULT_VARIANTS,
+                        help=f"apps to run (default: {' '.join(DEFAULT_VARIANTS)})")
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests from {args.clients} concurrent clients")
+    for name in args.variants:
+        result = asyncio.run(run(VARIANTS[name](), args))
+        print(
+            f"{name:>13}: {result['rps']:8.1f} req/s  "
+            f"p50 {result['p50']:7.1f} ms  p95 {result['p95']:7.1f} ms  "
+            f"errors {result['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
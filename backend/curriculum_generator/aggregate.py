@@ -1,109 +1,300 @@
+"""
+Build the concept bank from data/processed_curriculum.jsonl.
+
+The processed items are streamed into data/curriculum.db, where each
+sub-problem is stored once and linked to its parent problem's concepts
+through concept_sub_problems. Runs are incremental: only items whose result
+key is not in the database yet are inserted, items no longer in the
+processed file are removed, and everything is applied in one transaction
+with batched inserts. data/concept_bank.json and data/curriculum_summary.txt
+are regenerated from the database only when it changed:
+
+    python aggregate.py          # apply new results
+    python aggregate.py --full   # rebuild the database from scratch
+"""
+import argparse
+import hashlib
+import itertools
 import json
 import os
 import sqlite3
-from collections import defaultdict
 
-INPUT_FILE = "data/processed_curriculum.json"
+from checkpoint import JsonlCheckpoint
+
+INPUT_FILE = "data/processed_curriculum.jsonl"
 JSON_OUTPUT = "data/concept_bank.json"
 DB_OUTPUT = "data/curriculum.db"
+SUMMARY_FILE = "data/curriculum_summary.txt"
+SCHEMA_VERSION = 2
+BATCH_SIZE = 500
 
-def aggregate_data():
-    if not os.path.exists(INPUT_FILE):
-        print(f"Input file {INPUT_FILE} not found.")
-        return
-
-    with open(INPUT_FILE, "r") as f:
-        data = json.load(f)
-        
-    print(f"Loaded {len(data)} processed items.")
-    
-    # 1. Build Concept Bank (JSON)
-    concept_bank = defaultdict(list)
-    
-    for item in data:
-        concepts = item.get("concepts", [])
-        sub_problems = item.get("sub_problems", [])
-        
-        for concept in concepts:
-            # Add all sub-problems to this concept
-            # In a real app, we might filter sub-problems by specific concept tag if available
-            # But here we associate all sub-problems of the parent problem with its concepts
-            for sp in sub_problems:
-                entry = {
-                    "question": sp.get("question"),
-                    "answer": sp.get("answer"),
-                    "parent_id": item["id"],
-                    "parent_concept": concept, # The concept that led us here
-                    "key_insight": item.get("key_insight", "")
-                }
-                concept_bank[concept].append(entry)
-                
-    # Save JSON
-    with open(JSON_OUTPUT, "w") as f:
-        json.dump(concept_bank, f, indent=2)
-    print(f"Saved concept bank to {JSON_OUTPUT} with {len(concept_bank)} concepts.")
-    
-    # 2. Save to SQLite
-    conn = sqlite3.connect(DB_OUTPUT)
-    cursor = conn.cursor()
-    
-    # Create Tables
-    cursor.execute('''
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS problems (
+        id INTEGER PRIMARY KEY,
+        key TEXT UNIQUE NOT NULL,
+        parent_problem_id INTEGER,
+        problem_hash TEXT,
+        problem TEXT,
+        key_insight TEXT
+    )
+    """,
+    """
     CREATE TABLE IF NOT EXISTS concepts (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT UNIQUE
     )
-    ''')
-    
-    cursor.execute('''
+    """,
+    """
     CREATE TABLE IF NOT EXISTS sub_problems (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id INTEGER PRIMARY KEY,
+        problem_id INTEGER NOT NULL REFERENCES problems(id),
+        position INTEGER NOT NULL,
         question TEXT,
         answer TEXT,
-        concept_id INTEGER,
-        parent_problem_id INTEGER,
-        FOREIGN KEY(concept_id) REFERENCES concepts(id)
+        concept TEXT
     )
-    ''')
-    
-    # Insert Data
-    for concept_name, problems in concept_bank.items():
-        # Insert Concept
-        cursor.execute('INSERT OR IGNORE INTO concepts (name) VALUES (?)', (concept_name,))
-        cursor.execute('SELECT id FROM concepts WHERE name = ?', (concept_name,))
-        concept_id = cursor.fetchone()[0]
-        
-        # Insert Sub-problems
-        for p in problems:
-            cursor.execute('''
-            INSERT INTO sub_problems (question, answer, concept_id, parent_problem_id)
-            VALUES (?, ?, ?, ?)
-            ''', (p["question"], p["answer"], concept_id, p["parent_id"]))
-            
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS concept_sub_problems (
+        concept_id INTEGER NOT NULL REFERENCES concepts(id),
+        sub_problem_id INTEGER NOT NULL REFERENCES sub_problems(id),
+        PRIMARY KEY (concept_id, sub_problem_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_problems_problem_hash ON problems (problem_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_problems_parent_problem_id ON problems (parent_problem_id)",
+    "CREATE INDEX IF NOT EXISTS ix_sub_problems_problem_position ON sub_problems (problem_id, position)",
+    "CREATE INDEX IF NOT EXISTS ix_concept_sub_problems_sub_problem ON concept_sub_problems (sub_problem_id)",
+]
+
+
+def problem_hash(problem_text):
+    """
+    Hash of a problem's text, used to find the curriculum for a question.
+    """
+    return hashlib.sha256((problem_text or "").strip().encode("utf-8")).hexdigest()
+
+
+def clean_concepts(concepts):
+    names = []
+    for concept in concepts or []:
+        name = str(concept).strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def open_db(path, full=False):
+    conn = sqlite3.connect(path)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if full or version != SCHEMA_VERSION:
+        # Older databases stored one sub-problem row per concept; start over
+        for table in ("concept_sub_problems", "sub_problems", "concepts", "problems"):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     conn.commit()
-    conn.close()
-    print(f"Saved to SQLite database {DB_OUTPUT}")
+    return conn
+
+
+class Aggregator:
+    """
+    Applies processed items to the database in batches.
+    """
+
+    def __init__(self, conn, batch_size=BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.known = dict(conn.execute("SELECT key, parent_problem_id FROM problems"))
+        self.concept_ids = {name: cid for cid, name in conn.execute("SELECT id, name FROM concepts")}
+        self.next_problem_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM problems").fetchone()[0]
+        self.next_sub_problem_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM sub_problems").fetchone()[0]
+        self.seen = set()
+        self.moved = [] # (parent_problem_id, key) for items whose position in the input changed
+        self.added = 0
 
-    # 3. Generate Text Summary
-    SUMMARY_FILE = "data/curriculum_summary.txt"
-    with open(SUMMARY_FILE, "w") as f:
+    def apply(self, items):
+        batch = []
+        for item in items:
+            key = item["key"]
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            if key in self.known:
+                if self.known[key] != item["id"]:
+                    self.moved.append((item["id"], key))
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._insert(batch)
+                batch = []
+        if batch:
+            self._insert(batch)
+        if self.moved:
+            self.conn.executemany("UPDATE problems SET parent_problem_id = ? WHERE key = ?", self.moved)
+
+    def _insert(self, batch):
+        problems = []
+        sub_problems = []
+        links = []
+        new_concepts = []
+        for item in batch:
+            problem_id = self.next_problem_id
+            self.next_problem_id += 1
+            problems.append((
+                problem_id, item["key"], item["id"], problem_hash(item.get("original_problem")),
+                item.get("original_problem"), item.get("key_insight", ""),
+            ))
+            concepts = clean_concepts(item.get("concepts"))
+            for name in concepts:
+                if name not in self.concept_ids and name not in new_concepts:
+                    new_concepts.append(name)
+            for position, sp in enumerate(item.get("sub_problems") or []):
+                if not isinstance(sp, dict):
+                    continue
+                sub_problem_id = self.next_sub_problem_id
+                self.next_sub_problem_id += 1
+                sub_problems.append((sub_problem_id, problem_id, position, sp.get("question"), sp.get("answer"), sp.get("concept")))
+                links.extend((name, sub_problem_id) for name in concepts)
+
+        if new_concepts:
+            self.conn.executemany("INSERT OR IGNORE INTO concepts (name) VALUES (?)", [(name,) for name in new_concepts])
+            for start in range(0, len(new_concepts), 500):
+                names = new_concepts[start:start + 500]
+                placeholders = ",".join("?" * len(names))
+                for cid, name in self.conn.execute(f"SELECT id, name FROM concepts WHERE name IN ({placeholders})", names):
+                    self.concept_ids[name] = cid
+
+        self.conn.executemany(
+            "INSERT INTO problems (id, key, parent_problem_id, problem_hash, problem, key_insight) VALUES (?, ?, ?, ?, ?, ?)",
+            problems,
+        )
+        self.conn.executemany(
+            "INSERT INTO sub_problems (id, problem_id, position, question, answer, concept) VALUES (?, ?, ?, ?, ?, ?)",
+            sub_problems,
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO concept_sub_problems (concept_id, sub_problem_id) VALUES (?, ?)",
+            [(self.concept_ids[name], sub_problem_id) for name, sub_problem_id in links],
+        )
+        self.added += len(batch)
+
+    def remove_stale(self):
+        """
+        Delete problems that are no longer in the processed file. Returns the
+        number removed.
+        """
+        stale = [(key,) for key in self.known if key not in self.seen]
+        if not stale:
+            return 0
+        self.conn.execute("CREATE TEMP TABLE stale_keys (key TEXT PRIMARY KEY)")
+        self.conn.executemany("INSERT INTO stale_keys (key) VALUES (?)", stale)
+        stale_sub_problems = (
+            "SELECT s.id FROM sub_problems s JOIN problems p ON p.id = s.problem_id"
+            " WHERE p.key IN (SELECT key FROM stale_keys)"
+        )
+        self.conn.execute(f"DELETE FROM concept_sub_problems WHERE sub_problem_id IN ({stale_sub_problems})")
+        self.conn.execute(f"DELETE FROM sub_problems WHERE id IN ({stale_sub_problems})")
+        self.conn.execute("DELETE FROM problems WHERE key IN (SELECT key FROM stale_keys)")
+        self.conn.execute("DELETE FROM concepts WHERE id NOT IN (SELECT concept_id FROM concept_sub_problems)")
+        self.conn.execute("DROP TABLE stale_keys")
+        return len(stale)
+
+
+def concept_entries(conn):
+    """
+    Yield (concept, entries) in name order, with entries in the concept bank's format.
+    """
+    rows = conn.execute(
+        "SELECT c.name, s.question, s.answer, p.parent_problem_id, p.key_insight"
+        " FROM concepts c"
+        " JOIN concept_sub_problems cs ON cs.concept_id = c.id"
+        " JOIN sub_problems s ON s.id = cs.sub_problem_id"
+        " JOIN problems p ON p.id = s.problem_id"
+        " ORDER BY c.name, p.parent_problem_id, s.position"
+    )
+    for name, group in itertools.groupby(rows, key=lambda row: row[0]):
+        yield name, [
+            {"question": question, "answer": answer, "parent_id": parent_id, "parent_concept": name, "key_insight": key_insight or ""}
+            for _, question, answer, parent_id, key_insight in group
+        ]
+
+
+def write_concept_bank(conn, path):
+    count = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("{")
+        for name, entries in concept_entries(conn):
+            f.write(("," if count else "") + f"\n{json.dumps(name)}: {json.dumps(entries)}")
+            count += 1
+        f.write("\n}\n")
+    os.replace(tmp_path, path)
+    return count
+
+
+def write_summary(conn, path):
+    concepts = conn.execute(
+        "SELECT c.id, c.name, COUNT(*) AS n FROM concepts c"
+        " JOIN concept_sub_problems cs ON cs.concept_id = c.id"
+        " GROUP BY c.id ORDER BY n DESC, c.name"
+    ).fetchall()
+    total_problems = conn.execute("SELECT COUNT(*) FROM problems").fetchone()[0]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
         f.write("=== Curriculum Summary ===\n\n")
-        f.write(f"Total Concepts: {len(concept_bank)}\n")
-        f.write(f"Total Problems Processed: {len(data)}\n\n")
-        
-        # Sort concepts by number of sub-problems (descending)
-        sorted_concepts = sorted(concept_bank.items(), key=lambda x: len(x[1]), reverse=True)
-        
-        for concept, problems in sorted_concepts:
-            f.write(f"--- Concept: {concept} ({len(problems)} sub-problems) ---\n")
-            for i, p in enumerate(problems, 1):
-                f.write(f"  {i}. {p['question']}\n")
-                f.write(f"     Answer: {p['answer']}\n")
-                if p.get('key_insight'):
-                    f.write(f"     Insight: {p['key_insight']}\n")
+        f.write(f"Total Concepts: {len(concepts)}\n")
+        f.write(f"Total Problems Processed: {total_problems}\n\n")
+
+        for concept_id, concept, count in concepts:
+            f.write(f"--- Concept: {concept} ({count} sub-problems) ---\n")
+            rows = conn.execute(
+                "SELECT s.question, s.answer, p.key_insight FROM concept_sub_problems cs"
+                " JOIN sub_problems s ON s.id = cs.sub_problem_id"
+                " JOIN problems p ON p.id = s.problem_id"
+                " WHERE cs.concept_id = ? ORDER BY p.parent_problem_id, s.position",
+                (concept_id,),
+            )
+            for i, (question, answer, key_insight) in enumerate(rows, 1):
+                f.write(f"  {i}. {question}\n")
+                f.write(f"     Answer: {answer}\n")
+                if key_insight:
+                    f.write(f"     Insight: {key_insight}\n")
             f.write("\n")
-            
-    print(f"Saved text summary to {SUMMARY_FILE}")
+    os.replace(tmp_path, path)
+
+
+def aggregate_data(full=False, batch_size=BATCH_SIZE):
+    if not os.path.exists(INPUT_FILE):
+        print(f"Input file {INPUT_FILE} not found.")
+        return
+
+    conn = open_db(DB_OUTPUT, full)
+    try:
+        with conn:
+            aggregator = Aggregator(conn, batch_size)
+            aggregator.apply(JsonlCheckpoint(INPUT_FILE, key="key"))
+            removed = aggregator.remove_stale()
+        print(f"Read {len(aggregator.seen)} processed items: {aggregator.added} added, "
+              f"{removed} removed, {len(aggregator.moved)} renumbered.")
+
+        changed = aggregator.added or removed or aggregator.moved
+        if not changed and os.path.exists(JSON_OUTPUT) and os.path.exists(SUMMARY_FILE):
+            print("Concept bank is up to date.")
+            return
+        concepts = write_concept_bank(conn, JSON_OUTPUT)
+        print(f"Saved concept bank to {JSON_OUTPUT} with {concepts} concepts.")
+        write_summary(conn, SUMMARY_FILE)
+        print(f"Saved text summary to {SUMMARY_FILE}")
+    finally:
+        conn.close()
+
 
 if __name__ == "__main__":
-    aggregate_data()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="rebuild the database from scratch")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"items per insert batch (default: {BATCH_SIZE})")
+    args = parser.parse_args()
+    aggregate_data(args.full, args.batch_size)
@@ -0,0 +1,89 @@
+"""
+Append-only JSONL checkpoint for generated curriculum items.
+
+Each processed problem is appended as one JSON line and flushed, so saving
+progress costs one line rather than rewriting every result so far, and a
+crash loses at most the line being written. A torn last line is ignored on
+load. compact() rewrites the file with one line per key (the latest wins)
+into a temporary file and renames it over the original, so readers see
+either the old file or the new one, never a partial write.
+"""
+import json
+import os
+
+
+class JsonlCheckpoint:
+    def __init__(self, path, key="id"):
+        self.path = path
+        self.key = key
+        self._file = None
+
+    def __iter__(self):
+        """
+        Yield the records in the file, skipping a torn or malformed line.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def load(self):
+        """
+        Return {key: record} for every record, later lines replacing earlier ones.
+        """
+        return {record[self.key]: record for record in self}
+
+    def append(self, record):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            torn = self._ends_mid_line()
+            self._file = open(self.path, "a", encoding="utf-8")
+            if torn:
+                # Start on a fresh line so the next record stays readable
+                self._file.write("\n")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def _ends_mid_line(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return False
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def compact(self):
+        """
+        Atomically rewrite the file with one line per key. Returns the number
+        of records kept.
+        """
+        self.close()
+        return self.rewrite(self.load().values())
+
+    def rewrite(self, records):
+        """
+        Atomically replace the file's contents with `records`. Returns the
+        number of records written.
+        """
+        self.close()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        count = 0
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return count
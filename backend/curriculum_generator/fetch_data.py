@@ -1,6 +1,11 @@
+import argparse
 import json
 import os
-from datasets import load_dataset
+import sys
+
+# Snapshot reader lives in the backend package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from snapshots import load_dataset
 
 OUTPUT_DIR = "data"
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "raw_questions.json")
@@ -38,4 +43,6 @@ def fetch_problems(limit=100):
     print(f"Saved to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    fetch_problems()
+    parser = argparse.ArgumentParser(description="Fetch NuminaMath-CoT problems for generate.py")
+    parser.add_argument("--limit", type=int, default=100, help="number of problems (default: 100)")
+    fetch_problems(parser.parse_args().limit)
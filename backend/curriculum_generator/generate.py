@@ -1,15 +1,72 @@
+"""
+Generate a curriculum (key insight, concepts and sub-problems) for every
+problem in data/raw_questions.json with Ollama.
+
+Results are cached in data/curriculum_cache.jsonl under a hash of (model,
+prompt version, problem, solution), so a problem is only analyzed again when
+its text, the model or the prompt changes, however the problems are fetched
+or numbered. Each result is appended to the cache as it completes, so an
+interrupted run resumes where it stopped. At the end of a run the cache is
+compacted and data/processed_curriculum.jsonl is rewritten with the results
+for the problems in the current input. Several problems are processed at once:
+
+    python generate.py --workers 4 --rate 2   # 4 requests in flight, at most 2 started per second
+    python generate.py --limit 10             # try a few problems
+    python generate.py --model deepseek-r1
+
+Responses that are not the expected JSON are retried with exponential backoff.
+"""
+import argparse
+import hashlib
 import json
 import os
+import random
 import requests
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
+from checkpoint import JsonlCheckpoint
+
 INPUT_FILE = "data/raw_questions.json"
-OUTPUT_FILE = "data/processed_curriculum.json"
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OUTPUT_FILE = "data/processed_curriculum.jsonl"
+CACHE_FILE = "data/curriculum_cache.jsonl"
+LEGACY_OUTPUT_FILE = "data/processed_curriculum.json"
+OLLAMA_URL = os.environ.get("MATH_OLLAMA_URL", "http://localhost:11434") + "/api/generate"
 MODEL = "gemma3:latest" # or "deepseek-r1"
+TIMEOUT = 300 # Seconds for one generation
+# Bump when the prompt below changes so cached results are regenerated
+PROMPT_VERSION = 1
+RESULT_FIELDS = ("key_insight", "concepts", "sub_problems")
+
+class MalformedResponse(Exception):
+    pass
 
-def get_curriculum_from_ollama(problem_text, solution_text):
+class RateLimiter:
+    """
+    Spaces out request starts to at most `rate` per second across threads.
+    A rate of 0 means no limit.
+    """
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_start = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        time.sleep(start - now)
+
+def result_key(problem_text, solution_text, model=MODEL):
+    payload = json.dumps([model, PROMPT_VERSION, problem_text, solution_text])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_curriculum_from_ollama(problem_text, solution_text, model=MODEL):
     prompt = f"""
     You are an expert math curriculum designer. Analyze the following Olympiad-level math problem and its solution:
     
@@ -36,75 +93,136 @@ def get_curriculum_from_ollama(problem_text, solution_text):
     """
     
     payload = {
-        "model": MODEL,
+        "model": model,
         "prompt": prompt,
         "stream": False,
         "format": "json" # Force JSON mode if supported by model, otherwise prompt engineering handles it
     }
     
+    response = requests.post(OLLAMA_URL, json=payload, timeout=TIMEOUT)
+    response.raise_for_status()
+    raw = response.json().get("response", "")
     try:
-        response = requests.post(OLLAMA_URL, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        return json.loads(data["response"])
-    except Exception as e:
-        print(f"Error processing problem: {e}")
-        if 'data' in locals() and 'response' in data:
-             print(f"Raw Response: {data['response']}")
-        return None
+        result = json.loads(raw)
+    except json.JSONDecodeError:
+        raise MalformedResponse(f"Response is not JSON: {raw[:200]!r}")
+    if not isinstance(result, dict) or not isinstance(result.get("sub_problems"), list):
+        raise MalformedResponse(f"Response has no sub_problems list: {raw[:200]!r}")
+    return result
+
+def process_problem(problem, model, limiter, retries=3, backoff=2.0):
+    """
+    Returns the result fields for a problem, or None once every attempt has
+    failed. Waits backoff * 2^attempt seconds (with jitter) between attempts.
+    """
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            result = get_curriculum_from_ollama(problem["problem"], problem["solution"], model)
+            return {
+                "key_insight": result.get("key_insight", ""),
+                "concepts": result.get("concepts", []),
+                "sub_problems": result.get("sub_problems", [])
+            }
+        except (MalformedResponse, requests.RequestException) as e:
+            if attempt == retries:
+                print(f"Skipping ID {problem['id']} after {retries + 1} attempts: {e}")
+                return None
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+def cache_entry(key, model, result):
+    return {"key": key, "model": model, "prompt_version": PROMPT_VERSION, "result": result}
+
+def seed_cache(cache):
+    """
+    Fill a new cache from results written before it existed: the output of
+    earlier runs, whose items carry their cache key, or else the JSON file of
+    the old script, which always used MODEL with the current prompt. Never
+    keyed under --model, which may be a different model.
+    """
+    if os.path.exists(cache.path):
+        return 0
+    items = list(JsonlCheckpoint(OUTPUT_FILE))
+    if not items and os.path.exists(LEGACY_OUTPUT_FILE):
+        with open(LEGACY_OUTPUT_FILE, "r") as f:
+            items = json.load(f)
+    for item in items:
+        if item.get("key"):
+            # The model is only recorded in the key
+            key, model = item["key"], None
+        else:
+            key, model = result_key(item["original_problem"], item["original_solution"], MODEL), MODEL
+        cache.append(cache_entry(key, model, {field: item.get(field) for field in RESULT_FIELDS}))
+    cache.compact()
+    return len(items)
+
+def processed_items(problems, keys, results):
+    for problem in problems:
+        entry = results.get(keys[problem["id"]])
+        if entry is not None:
+            yield {
+                "id": problem["id"],
+                "key": entry["key"],
+                "original_problem": problem["problem"],
+                "original_solution": problem["solution"],
+                **entry["result"]
+            }
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL, help=f"Ollama model (default: {MODEL})")
+    parser.add_argument("--workers", type=int, default=2, help="requests in flight at once (default: 2)")
+    parser.add_argument("--rate", type=float, default=0, help="most requests started per second (default: no limit)")
+    parser.add_argument("--retries", type=int, default=3, help="retries for a failed or malformed response (default: 3)")
+    parser.add_argument("--limit", type=int, default=0, help="process at most this many new problems (default: all)")
+    args = parser.parse_args()
+
     if not os.path.exists(INPUT_FILE):
         print(f"Input file {INPUT_FILE} not found.")
         return
 
     with open(INPUT_FILE, "r") as f:
         problems = json.load(f)
-        
-    # Load existing progress
-    processed = []
-    if os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE, "r") as f:
-            processed = json.load(f)
-            
-    processed_ids = {p["id"] for p in processed}
-    
-    print(f"Found {len(problems)} problems. Already processed {len(processed)}.")
-    
-    count = 0
-    # limit = 1 # Set small limit for testing
-    
-    for problem in tqdm(problems):
-        # if count >= limit:
-        #     break
-            
-        if problem["id"] in processed_ids:
-            continue
-            
-        print(f"Processing ID {problem['id']}...")
-        result = get_curriculum_from_ollama(problem["problem"], problem["solution"])
-        
-        if result:
-            processed_item = {
-                "id": problem["id"],
-                "original_problem": problem["problem"],
-                "original_solution": problem["solution"],
-                "key_insight": result.get("key_insight", ""),
-                "concepts": result.get("concepts", []),
-                "sub_problems": result.get("sub_problems", [])
-            }
-            processed.append(processed_item)
-            
-            # Save incrementally
-            with open(OUTPUT_FILE, "w") as f:
-                json.dump(processed, f, indent=2)
-            
-            count += 1
-        else:
-            print(f"Skipping ID {problem['id']} due to error.")
-            
-        # Rate limiting to be nice to local hardware
-        time.sleep(1)
+
+    # Load cached results
+    cache = JsonlCheckpoint(CACHE_FILE, key="key")
+    seeded = seed_cache(cache)
+    if seeded:
+        print(f"Seeded {CACHE_FILE} with {seeded} earlier results")
+    results = cache.load()
+
+    keys = {p["id"]: result_key(p["problem"], p["solution"], args.model) for p in problems}
+    cached = sum(1 for p in problems if keys[p["id"]] in results)
+    pending = {}
+    for problem in problems:
+        if keys[problem["id"]] not in results:
+            pending.setdefault(keys[problem["id"]], problem) # Identical problems are analyzed once
+    pending = list(pending.items())
+    if args.limit:
+        pending = pending[:args.limit]
+
+    print(f"Found {len(problems)} problems. {cached} cached for {args.model}. Processing {len(pending)}.")
+
+    limiter = RateLimiter(args.rate)
+    failed = 0
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        futures = {executor.submit(process_problem, p, args.model, limiter, args.retries): key for key, p in pending}
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            result = future.result()
+            if result:
+                key = futures[future]
+                results[key] = cache_entry(key, args.model, result)
+                cache.append(results[key])
+            else:
+                failed += 1
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume.")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        cache.compact()
+        written = JsonlCheckpoint(OUTPUT_FILE).rewrite(processed_items(problems, keys, results))
+    print(f"{written} of {len(problems)} problems processed in {OUTPUT_FILE} ({failed} failed this run).")
 
 if __name__ == "__main__":
     main()
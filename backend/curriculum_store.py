@@ -0,0 +1,193 @@
+"""
+Read-only access to the curriculum database built by
+curriculum_generator/aggregate.py, for the /concepts endpoints.
+
+The database is opened read-only once per worker thread and kept open, and
+query results are kept in an LRU so repeated drill-downs do not touch SQLite
+at all. The file is checked for changes at most once a second; when
+aggregate.py rewrites it, the cached results are dropped.
+
+Configure with:
+    MATH_CURRICULUM_DB          path to curriculum.db (default curriculum_generator/data/curriculum.db)
+    MATH_CURRICULUM_CACHE_SIZE  query results kept in memory (default 2000)
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DB_PATH = os.environ.get("MATH_CURRICULUM_DB", "curriculum_generator/data/curriculum.db")
+CACHE_SIZE = int(os.environ.get("MATH_CURRICULUM_CACHE_SIZE", 2000))
+CHECK_INTERVAL = 1.0
+
+
+class CurriculumUnavailable(Exception):
+    pass
+
+
+def problem_hash(problem_text):
+    # Must match curriculum_generator/aggregate.py
+    return hashlib.sha256((problem_text or "").strip().encode("utf-8")).hexdigest()
+
+
+class CurriculumStore:
+    def __init__(self, path=DB_PATH, cache_size=CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._version = None
+        self._checked_at = 0.0
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    def _file_version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _check(self):
+        now = time.monotonic()
+        if now - self._checked_at < CHECK_INTERVAL and self._version is not None:
+            return
+        version = self._file_version()
+        with self._lock:
+            self._checked_at = now
+            if version != self._version:
+                self._version = version
+                self._cache.clear()
+        if version is None:
+            raise CurriculumUnavailable(f"{self.path} not found; run curriculum_generator/aggregate.py")
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.version != self._version:
+            if conn is not None:
+                conn.close()
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON")
+            conn.execute("PRAGMA mmap_size = 67108864")
+            self._local.conn = conn
+            self._local.version = self._version
+        return conn
+
+    def _cached(self, key, compute):
+        self._check()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+        value = compute(self._db())
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = value
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def concepts(self, skip=0, limit=50):
+        """
+        Concepts with their sub-problem and problem counts, largest first.
+        """
+        def compute(db):
+            total = db.execute("SELECT COUNT(*) FROM concepts").fetchone()[0]
+            rows = db.execute(
+                "SELECT c.id, c.name, COUNT(*) AS n, COUNT(DISTINCT s.problem_id)"
+                " FROM concepts c"
+                " JOIN concept_sub_problems cs ON cs.concept_id = c.id"
+                " JOIN sub_problems s ON s.id = cs.sub_problem_id"
+                " GROUP BY c.id ORDER BY n DESC, c.name LIMIT ? OFFSET ?",
+                (limit, skip),
+            ).fetchall()
+            items = [
+                {"id": cid, "name": name, "sub_problems": count, "problems": problems}
+                for cid, name, count, problems in rows
+            ]
+            return {"total": total, "skip": skip, "limit": limit, "items": items}
+        return self._cached(("concepts", skip, limit), compute)
+
+    def sub_problems(self, concept_id, skip=0, limit=50):
+        """
+        A page of the sub-problems linked to a concept, or None if there is no
+        such concept.
+        """
+        def compute(db):
+            concept = db.execute("SELECT id, name FROM concepts WHERE id = ?", (concept_id,)).fetchone()
+            if concept is None:
+                return None
+            total = db.execute(
+                "SELECT COUNT(*) FROM concept_sub_problems WHERE concept_id = ?", (concept_id,)
+            ).fetchone()[0]
+            rows = db.execute(
+                "SELECT s.id, s.position, s.question, s.answer, s.concept, p.parent_problem_id, p.key_insight"
+                " FROM concept_sub_problems cs"
+                " JOIN sub_problems s ON s.id = cs.sub_problem_id"
+                " JOIN problems p ON p.id = s.problem_id"
+                " WHERE cs.concept_id = ? ORDER BY p.parent_problem_id, s.position LIMIT ? OFFSET ?",
+                (concept_id, limit, skip),
+            ).fetchall()
+            items = [
+                {"id": sid, "position": position, "question": question, "answer": answer, "concept": concept_tag,
+                 "parent_problem_id": parent_id, "key_insight": key_insight}
+                for sid, position, question, answer, concept_tag, parent_id, key_insight in rows
+            ]
+            return {"concept": {"id": concept[0], "name": concept[1]}, "total": total, "skip": skip, "limit": limit, "items": items}
+        return self._cached(("sub_problems", concept_id, skip, limit), compute)
+
+    def ladder(self, problem_text):
+        """
+        The key insight, concepts and ordered sub-problems generated for a
+        problem, or None if it has no curriculum.
+        """
+        digest = problem_hash(problem_text)
+
+        def compute(db):
+            problem = db.execute(
+                "SELECT id, key_insight FROM problems WHERE problem_hash = ? ORDER BY id DESC LIMIT 1", (digest,)
+            ).fetchone()
+            if problem is None:
+                return None
+            problem_id, key_insight = problem
+            steps = [
+                {"id": sid, "position": position, "question": question, "answer": answer, "concept": concept_tag}
+                for sid, position, question, answer, concept_tag in db.execute(
+                    "SELECT id, position, question, answer, concept FROM sub_problems"
+                    " WHERE problem_id = ? ORDER BY position",
+                    (problem_id,),
+                )
+            ]
+            concepts = [
+                {"id": cid, "name": name}
+                for cid, name in db.execute(
+                    "SELECT DISTINCT c.id, c.name FROM sub_problems s"
+                    " JOIN concept_sub_problems cs ON cs.sub_problem_id = s.id"
+                    " JOIN concepts c ON c.id = cs.concept_id"
+                    " WHERE s.problem_id = ? ORDER BY c.name",
+                    (problem_id,),
+                )
+            ]
+            return {"key_insight": key_insight, "concepts": concepts, "steps": steps}
+        return self._cached(("ladder", digest), compute)
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._cache),
+                "limit": self.cache_size,
+            }
+
+
+store = CurriculumStore()
@@ -1,14 +1,109 @@
-from sqlalchemy import create_engine
+import os
+from dataclasses import dataclass
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./math_practice.db"
 
+@dataclass
+class EngineProfile:
+    """
+    SQLite tuning knobs. Every field can be overridden with a MATH_DB_*
+    environment variable, e.g. MATH_DB_MMAP_SIZE=0 to turn off mmap reads.
+    """
+    path: str = "./math_practice.db"
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL" # Safe with WAL; FULL fsyncs every commit
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size: int = -64000 # Negative means KiB, i.e. 64 MB per connection
+    busy_timeout_ms: int = 5000
+    read_pool_size: int = 20
+    read_pool_overflow: int = 20
+
+    @classmethod
+    def from_env(cls):
+        profile = cls()
+        for name, default in vars(cls()).items():
+            value = os.environ.get(f"MATH_DB_{name.upper()}")
+            if value is not None:
+                setattr(profile, name, type(default)(value))
+        return profile
+
+    @property
+    def sync_url(self):
+        return f"sqlite:///{self.path}"
+
+    @property
+    def async_url(self):
+        return f"sqlite+aiosqlite:///{self.path}"
+
+    def pragmas(self, read_only=False):
+        pragmas = [
+            f"PRAGMA journal_mode={self.journal_mode}",
+            f"PRAGMA synchronous={self.synchronous}",
+            f"PRAGMA mmap_size={self.mmap_size}",
+            f"PRAGMA cache_size={self.cache_size}",
+            f"PRAGMA busy_timeout={self.busy_timeout_ms}",
+        ]
+        if read_only:
+            pragmas.append("PRAGMA query_only=ON")
+        return pragmas
+
+
+def configure_sqlite(engine, profile, read_only=False):
+    """
+    Apply the profile's PRAGMAs to every new connection. Writers start their
+    transactions with BEGIN IMMEDIATE so they take the write lock up front
+    (and wait on busy_timeout) instead of failing with "database is locked"
+    when a read transaction tries to upgrade.
+    """
+    pragmas = profile.pragmas(read_only=read_only)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy, not the driver, decide when transactions begin
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def on_begin(conn):
+        conn.exec_driver_sql("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
+
+profile = EngineProfile.from_env()
+
+SQLALCHEMY_DATABASE_URL = profile.sync_url
+ASYNC_SQLALCHEMY_DATABASE_URL = profile.async_url
+
+# Sync engine for scripts (importers, seeding)
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+configure_sqlite(engine, profile)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engines used by the API endpoints. Reads get a pool of query-only
+# connections; writes go through a single connection so they are serialized
+# in-process rather than contending for SQLite's lock.
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL, pool_size=1, max_overflow=0, pool_timeout=60
+)
+configure_sqlite(async_engine.sync_engine, profile)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async_read_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    pool_size=profile.read_pool_size,
+    max_overflow=profile.read_pool_overflow,
+)
+configure_sqlite(async_read_engine.sync_engine, profile, read_only=True)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -17,3 +112,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
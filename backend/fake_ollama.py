@@ -0,0 +1,74 @@
+"""
+A stand-in for Ollama's /api/generate, for running the hint endpoints and
+load tests without a model:
+
+    python fake_ollama.py --port 11435 --delay-ms 50
+    MATH_OLLAMA_URL=http://localhost:11435 uvicorn main:app
+
+Every generation streams the same canned hint word by word, waiting
+--delay-ms between chunks. GET /_stats reports how many generations were
+requested, how many ran at the same time and how many clients disconnected
+mid-stream.
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+DELAY_MS = float(os.environ.get("FAKE_OLLAMA_DELAY_MS", 50))
+HINT = "Try looking at a smaller case first, then see which quantity stays the same as the problem grows."
+
+app = FastAPI(title="Fake Ollama")
+stats = {"generations": 0, "active": 0, "max_active": 0, "disconnects": 0, "prompts": {}}
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": "gemma3:latest"}]}
+
+
+@app.get("/_stats")
+async def get_stats():
+    return stats
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    stats["generations"] += 1
+    stats["prompts"][model] = stats["prompts"].get(model, 0) + 1
+    words = [f"{word} " for word in HINT.split()]
+
+    async def chunks():
+        stats["active"] += 1
+        stats["max_active"] = max(stats["max_active"], stats["active"])
+        try:
+            for word in words:
+                await asyncio.sleep(DELAY_MS / 1000)
+                yield json.dumps({"model": model, "response": word, "done": False}) + "\n"
+            yield json.dumps({"model": model, "response": "", "done": True}) + "\n"
+        except asyncio.CancelledError:
+            stats["disconnects"] += 1
+            raise
+        finally:
+            stats["active"] -= 1
+
+    if body.get("stream", True):
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+    await asyncio.sleep(DELAY_MS * len(words) / 1000)
+    return {"model": model, "response": "".join(words), "done": True}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--delay-ms", type=float, default=DELAY_MS)
+    args = parser.parse_args()
+    DELAY_MS = args.delay_ms
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
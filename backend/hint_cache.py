@@ -0,0 +1,185 @@
+"""
+Two-tier cache for generated hints.
+
+Hints are keyed by a hash of (model, prompt template version, question text)
+and stored as the list of chunks the model streamed, so a cached hint can be
+replayed through /hint/stream the way it was generated. Lookups go to an
+in-memory LRU first and then to a SQLite file that survives restarts.
+
+Configure with:
+    MATH_HINT_CACHE_PATH           SQLite file (default ./hint_cache.db)
+    MATH_HINT_CACHE_MEMORY         entries kept in memory (default 1000)
+    MATH_HINT_CACHE_MAX_PER_MODEL  entries kept on disk per model (default 5000)
+    MATH_HINT_CACHE_MODEL_LIMITS   per-model overrides, e.g. "gemma3:latest=20000,deepseek-r1=2000"
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_PATH = os.environ.get("MATH_HINT_CACHE_PATH", "./hint_cache.db")
+MEMORY_ENTRIES = int(os.environ.get("MATH_HINT_CACHE_MEMORY", 1000))
+MAX_PER_MODEL = int(os.environ.get("MATH_HINT_CACHE_MAX_PER_MODEL", 5000))
+
+
+def parse_model_limits(value):
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        model, _, limit = item.rpartition("=")
+        limits[model] = int(limit)
+    return limits
+
+
+MODEL_LIMITS = parse_model_limits(os.environ.get("MATH_HINT_CACHE_MODEL_LIMITS", ""))
+
+
+def cache_key(model, prompt_version, question_text):
+    payload = json.dumps([model, prompt_version, question_text])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class HintCache:
+    def __init__(self, path=CACHE_PATH, memory_entries=MEMORY_ENTRIES, max_per_model=MAX_PER_MODEL, model_limits=None):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_per_model = max_per_model
+        self.model_limits = MODEL_LIMITS if model_limits is None else model_limits
+        self._memory = OrderedDict() # key -> chunks
+        self._lock = threading.Lock()
+        self._conn = None
+
+        # Metrics
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hints ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " prompt_version INTEGER NOT NULL,"
+                " chunks TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_hints_model_last_used ON hints (model, last_used)")
+        return self._conn
+
+    def limit_for(self, model):
+        return self.model_limits.get(model, self.max_per_model)
+
+    def _remember(self, key, chunks):
+        self._memory[key] = chunks
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Return the cached chunks for a key, or None.
+        """
+        with self._lock:
+            chunks = self._memory.get(key)
+            if chunks is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return chunks
+
+            db = self._db()
+            row = db.execute("SELECT chunks FROM hints WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE hints SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+            chunks = json.loads(row[0])
+            self._remember(key, chunks)
+            self.disk_hits += 1
+            return chunks
+
+    def cached_keys(self, keys):
+        """
+        Return the subset of keys that are stored on disk, without counting
+        lookups or touching recency.
+        """
+        keys = list(keys)
+        found = set()
+        with self._lock:
+            db = self._db()
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(key for (key,) in db.execute(f"SELECT key FROM hints WHERE key IN ({placeholders})", batch))
+        return found
+
+    def put(self, key, model, prompt_version, chunks):
+        chunks = list(chunks)
+        now = time.time()
+        with self._lock:
+            self._remember(key, chunks)
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO hints (key, model, prompt_version, chunks, size, created_at, last_used, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, model, prompt_version, json.dumps(chunks), sum(len(c) for c in chunks), now, now),
+            )
+            self.stores += 1
+            self._evict(db, model)
+
+    def _evict(self, db, model):
+        # Drop the model's least recently used entries beyond its limit
+        evicted = db.execute(
+            "DELETE FROM hints WHERE key IN ("
+            " SELECT key FROM hints WHERE model = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?"
+            ") RETURNING key",
+            (model, self.limit_for(model)),
+        ).fetchall()
+        for (key,) in evicted:
+            self._memory.pop(key, None)
+        self.evictions += len(evicted)
+
+    def clear(self, model=None):
+        with self._lock:
+            db = self._db()
+            if model is None:
+                db.execute("DELETE FROM hints")
+                self._memory.clear()
+            else:
+                keys = db.execute("DELETE FROM hints WHERE model = ? RETURNING key", (model,)).fetchall()
+                for (key,) in keys:
+                    self._memory.pop(key, None)
+
+    def metrics(self):
+        with self._lock:
+            per_model = {
+                model: {"entries": entries, "bytes": size or 0, "limit": self.limit_for(model)}
+                for model, entries, size in self._db().execute(
+                    "SELECT model, COUNT(*), SUM(size) FROM hints GROUP BY model"
+                )
+            }
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_limit": self.memory_entries,
+                "models": per_model,
+            }
+
+
+cache = HintCache()
@@ -0,0 +1,127 @@
+"""
+Streaming responses for /hint/stream.
+
+HintStream sends hint chunks either as plain text (the default) or as
+server-sent events:
+
+    event: chunk
+    data: {"text": "Try looking at "}
+
+    event: done
+    data: {"cached": false, "ttft_ms": 412.5, "chunks": 37}
+
+It watches for the client disconnecting on every ASGI server, not only those
+that report spec 2.3 and below, and closes the chunk iterator as soon as it
+does, which cancels the upstream generation once no one else is following
+it. Sending is pull-based end to end: a chunk is only taken from the
+generation when the previous one has been handed to the server, and the
+server's send waits on the socket's flow control. A client that stops
+reading for MATH_HINT_STREAM_STALL_SECONDS is treated as gone.
+"""
+import json
+import math
+import os
+import statistics
+import time
+from collections import deque
+
+import anyio
+from starlette.responses import StreamingResponse
+
+import llm_service
+
+STALL_SECONDS = float(os.environ.get("MATH_HINT_STREAM_STALL_SECONDS", 30))
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": None, "p95": None}
+    ordered = sorted(samples)
+    return {
+        "p50": round(statistics.median(ordered), 1),
+        "p95": round(ordered[math.ceil(len(ordered) * 0.95) - 1], 1),
+    }
+
+
+class StreamStats:
+    def __init__(self, samples=1000):
+        self.started = 0
+        self.completed = 0
+        self.disconnected = 0
+        self.stalled = 0
+        self.errors = 0
+        self.ttft_ms = {"cached": deque(maxlen=samples), "generated": deque(maxlen=samples)}
+
+    def metrics(self):
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "disconnected": self.disconnected,
+            "stalled": self.stalled,
+            "errors": self.errors,
+            "ttft_ms": {kind: percentiles(samples) for kind, samples in self.ttft_ms.items()},
+        }
+
+
+stats = StreamStats()
+
+
+class HintStream(StreamingResponse):
+    def __init__(self, chunks, sse=False, cached=False, started=None):
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        super().__init__(chunks, media_type="text/event-stream" if sse else "text/plain", headers=headers)
+        self.sse = sse
+        self.cached = cached
+        self.started = started or time.perf_counter()
+        self.finished = False
+
+    def _event(self, event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+    async def _send_body(self, send, body):
+        with anyio.fail_after(STALL_SECONDS):
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+
+    async def stream_response(self, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        ttft_ms = None
+        count = 0
+        try:
+            try:
+                async for chunk in self.body_iterator:
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - self.started) * 1000
+                        stats.ttft_ms["cached" if self.cached else "generated"].append(ttft_ms)
+                    count += 1
+                    await self._send_body(send, self._event("chunk", {"text": chunk}) if self.sse else chunk.encode("utf-8"))
+            except TimeoutError:
+                stats.stalled += 1
+                return
+            except Exception as e:
+                stats.errors += 1
+                message = llm_service.error_message(e)
+                await self._send_body(send, self._event("error", {"message": message}) if self.sse else message.encode("utf-8"))
+            else:
+                if self.sse:
+                    done = {"cached": self.cached, "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None, "chunks": count}
+                    await self._send_body(send, self._event("done", done))
+        finally:
+            # Release the generation even if the client went away mid-send
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+        self.finished = True
+        stats.completed += 1
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def __call__(self, scope, receive, send):
+        stats.started += 1
+        async with anyio.create_task_group() as task_group:
+            async def run():
+                await self.stream_response(send)
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(run)
+            await self.listen_for_disconnect(receive)
+            if not self.finished:
+                stats.disconnected += 1
+            task_group.cancel_scope.cancel()
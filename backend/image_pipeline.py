@@ -0,0 +1,191 @@
+"""
+Content-addressed storage for question images.
+
+Every image is named by a hash of its decoded pixels, so the same picture
+imported twice is stored once and a file never changes once written (safe
+to cache forever). Two files are kept per image:
+
+    static/questions/images/<hash>.png    lossless original
+    static/questions/images/<hash>.webp   downscaled derivative served to clients
+
+Question.image_path points at the derivative, and image_width/image_height
+record its size so the frontend can reserve space before it loads.
+
+Encoding runs in a process pool. To move existing images over:
+
+    python image_pipeline.py                              # questions whose image_path is not hashed yet
+    python image_pipeline.py ../static/questions/olymmath # every image in a directory
+
+Tune with MATH_IMAGE_MAX_WIDTH and MATH_IMAGE_WEBP_QUALITY.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+IMAGE_DIR = "static/questions/images"
+MAX_WIDTH = int(os.environ.get("MATH_IMAGE_MAX_WIDTH", 800))
+WEBP_QUALITY = int(os.environ.get("MATH_IMAGE_WEBP_QUALITY", 80))
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp"}
+
+
+def pixel_hash(image):
+    digest = hashlib.sha256(f"{image.mode}:{image.size}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()[:32]
+
+
+def store_image(image, out_dir=IMAGE_DIR):
+    """
+    Store a PIL image (or a path to one) under its content hash and return
+    {"image_path", "image_width", "image_height"} for the derivative.
+    Images that are already stored are not encoded again.
+    """
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    image.load()
+
+    name = pixel_hash(image)
+    original_path = os.path.join(out_dir, f"{name}.png")
+    derivative_path = os.path.join(out_dir, f"{name}.webp")
+    os.makedirs(out_dir, exist_ok=True)
+
+    if not os.path.exists(original_path):
+        _write_atomic(original_path, image, format="PNG", optimize=True)
+
+    if os.path.exists(derivative_path):
+        with Image.open(derivative_path) as existing:
+            width, height = existing.size
+    else:
+        derivative = image if image.mode in ("RGB", "RGBA") else image.convert("RGBA")
+        if derivative.width > MAX_WIDTH:
+            height = round(derivative.height * MAX_WIDTH / derivative.width)
+            derivative = derivative.resize((MAX_WIDTH, height), Image.LANCZOS)
+        width, height = derivative.size
+        _write_atomic(derivative_path, derivative, format="WEBP", quality=WEBP_QUALITY, method=4)
+
+    return {
+        "image_path": url_path(derivative_path),
+        "image_width": width,
+        "image_height": height,
+    }
+
+
+def url_path(path):
+    """
+    URL of a file under a static/ directory, which the API serves at /static.
+    """
+    path = os.path.normpath(path).replace(os.sep, "/")
+    parts = path.lstrip("/").split("/")
+    if "static" in parts:
+        parts = parts[parts.index("static"):]
+    return "/" + "/".join(parts)
+
+
+def _write_atomic(path, image, **params):
+    # Parallel imports may store the same image at once; whoever renames last
+    # writes identical bytes
+    buffer = io.BytesIO()
+    image.save(buffer, **params)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp, path)
+
+
+def store_images(items, out_dir=IMAGE_DIR, workers=None, window=64):
+    """
+    Store images from an iterable of (image, payload) pairs in a process pool
+    and yield (stored, payload) in input order. `image` may be None, in which
+    case `stored` is None. At most `window` images are in flight.
+    """
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for image, payload in items:
+            future = pool.submit(store_image, image, out_dir) if image is not None else None
+            pending.append((future, payload))
+            while len(pending) >= window:
+                yield _result(pending.popleft())
+        while pending:
+            yield _result(pending.popleft())
+
+
+def _result(entry):
+    future, payload = entry
+    return (future.result() if future is not None else None), payload
+
+
+def is_stored(image_path, out_dir=IMAGE_DIR):
+    return bool(image_path) and image_path.startswith(url_path(out_dir) + "/")
+
+
+def migrate_questions(out_dir=IMAGE_DIR, workers=None):
+    """
+    Move questions whose image_path still points at a legacy file onto the
+    content-addressed store.
+    """
+    import models
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = [
+            (q.id, q.image_path)
+            for q in db.query(models.Question.id, models.Question.image_path)
+            .filter(models.Question.image_path.isnot(None))
+            if not is_stored(q.image_path, out_dir)
+        ]
+        items = []
+        for qid, image_path in rows:
+            path = image_path.lstrip("/")
+            if os.path.exists(path):
+                items.append((path, qid))
+            else:
+                print(f"Question {qid}: {image_path} not found, skipped")
+
+        updated = 0
+        for stored, qid in store_images(items, out_dir, workers):
+            db.query(models.Question).filter(models.Question.id == qid).update(stored)
+            updated += 1
+        db.commit()
+        print(f"Moved {updated} question images to {out_dir}")
+    finally:
+        db.close()
+
+
+def migrate_directory(directory, out_dir=IMAGE_DIR, workers=None):
+    """
+    Store every image in a directory and write manifest.json there mapping
+    each original filename to its stored derivative.
+    """
+    names = sorted(
+        name for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+    items = [(os.path.join(directory, name), name) for name in names]
+    manifest = {name: stored for stored, name in store_images(items, out_dir, workers)}
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"Stored {len(manifest)} images from {directory} ({len({s['image_path'] for s in manifest.values()})} unique)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directories", nargs="*", help="image directories to store (default: migrate question rows)")
+    parser.add_argument("--out", default=IMAGE_DIR, help=f"output directory (default: {IMAGE_DIR})")
+    parser.add_argument("--workers", type=int, default=None, help="encoder processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if not args.directories:
+        migrate_questions(args.out, args.workers)
+    for directory in args.directories:
+        migrate_directory(directory, args.out, args.workers)
+
+
+if __name__ == "__main__":
+    main()
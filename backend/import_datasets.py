@@ -1,16 +1,47 @@
+"""
+Dataset importer.
+
+Each source is parsed in its own worker process, which turns dataset records
+into plain row mappings and sends them to the parent in batches over a queue.
+The parent bulk-writes every batch (questions plus their raw records) in one
+transaction, so no ORM objects are built for imported rows.
+
+Imports are incremental: rows are upserted on (source, external_id), rows
+whose content hash is unchanged are skipped, and each source's stream
+position is checkpointed so the next run starts where the last one stopped.
+
+    python import_datasets.py                          # next 20 rows per source
+    python import_datasets.py --limit 0                # everything new
+    python import_datasets.py --limit 0 --full         # re-read all, update changed rows
+    python import_datasets.py --limit 20 --source-limit NuminaMath-CoT=50000
+    python import_datasets.py --sources OlymMATH OlympiadBench
+
+Datasets are read from local snapshots when they exist (see snapshots.py).
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+import queue
 import random
 import re
-from datasets import load_dataset
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import SessionLocal
 import models
-import json
+import image_pipeline
+import migrate
+import near_duplicates
+import search_index
+import topic_taxonomy
+from snapshots import load_dataset
 
-# Create tables
-print("Creating tables...")
-models.Base.metadata.create_all(bind=engine)
-print(f"Question columns: {models.Question.__table__.columns.keys()}")
+BATCH_SIZE = 2000
 
 def get_db():
     db = SessionLocal()
@@ -24,10 +55,23 @@ def clear_data(source=None):
     try:
         if source:
             print(f"Clearing questions from {source}...")
+            source_ids = db.query(models.Question.id).filter(models.Question.source == source)
+            search_index.remove_questions(db, [qid for (qid,) in source_ids])
+            topic_taxonomy.remove_questions(db, [qid for (qid,) in source_ids])
+            near_duplicates.remove_questions(db, [qid for (qid,) in source_ids])
+            db.query(models.QuestionRecord).filter(
+                models.QuestionRecord.question_id.in_(source_ids.scalar_subquery())
+            ).delete(synchronize_session=False)
             db.query(models.Question).filter(models.Question.source == source).delete()
+            db.query(models.ImportCheckpoint).filter(models.ImportCheckpoint.source == source).delete()
         else:
             print("Clearing all questions...")
+            search_index.remove_questions(db)
+            topic_taxonomy.remove_questions(db)
+            near_duplicates.remove_questions(db)
+            db.query(models.QuestionRecord).delete()
             db.query(models.Question).delete()
+            db.query(models.ImportCheckpoint).delete()
         db.commit()
     except Exception as e:
         print(f"Error clearing data: {e}")
@@ -41,7 +85,10 @@ def generate_options(answer_str):
     If numeric, generate distractors.
     If not, return None (or handle as open-ended in UI).
     Current UI expects options, so we'll try our best.
+    Distractors are seeded by the answer, so re-importing a record produces
+    the same row.
     """
+    rng = random.Random(answer_str)
     options = []
     correct_label = "A"
     
@@ -58,7 +105,7 @@ def generate_options(answer_str):
         while len(distractors) < 4 and attempts < 20:
             attempts += 1
             # Random variation within +/- 50%
-            d = ans_val * (1 + (random.random() - 0.5))
+            d = ans_val * (1 + (rng.random() - 0.5))
             # Round to 2 decimals
             d = round(d, 2)
             if d != ans_val:
@@ -66,10 +113,10 @@ def generate_options(answer_str):
         
         # Fill remaining with random integers if needed
         while len(distractors) < 4:
-            distractors.add(str(random.randint(1, 100)))
+            distractors.add(str(rng.randint(1, 100)))
 
-        options_list = [str(ans_val)] + list(distractors)
-        random.shuffle(options_list)
+        options_list = [str(ans_val)] + sorted(distractors)
+        rng.shuffle(options_list)
         
         labels = ['A', 'B', 'C', 'D', 'E']
         for idx, opt in enumerate(options_list):
@@ -84,262 +131,441 @@ def generate_options(answer_str):
         # Ideally UI handles open-ended, but let's stick to this for compatibility
         return [answer_str, "N/A", "N/A", "N/A", "N/A"], "A"
 
-def import_olymmath(limit=20):
-    print("--- Importing OlymMATH ---")
-    db = SessionLocal()
-    try:
-        dataset = load_dataset("RUC-AIBOX/OlymMATH", "en-easy", split="test", streaming=True)
-        
-        count = 0
-        for item in dataset:
-            if count >= limit:
-                break
-                
-            problem = item.get('problem')
-            answer = item.get('answer')
-            topic = item.get('subject')
-            uid = item.get('unique_id')
-            
-            if not problem or not answer:
-                continue
-                
-            options, correct_label = generate_options(answer)
-            
-            q = models.Question(
-                source="OlymMATH",
-                external_id=uid,
-                problem=problem,
-                answer=answer,
-                topic=topic,
-                difficulty=2, # Easy -> 2
-                options=options,
-                correct_option_label=correct_label,
-                meta_data=item
-            )
-            db.add(q)
-            count += 1
-            
-        db.commit()
-        print(f"Imported {count} OlymMATH questions.")
-    except Exception as e:
-        print(f"Error importing OlymMATH: {e}")
-        db.rollback()
-    finally:
-        db.close()
+def stream_from(dataset, start):
+    """
+    Enumerate a streaming dataset from a stream position.
+    """
+    if start:
+        dataset = dataset.skip(start)
+    return enumerate(dataset, start)
 
-def import_numinamath(limit=20):
-    print("--- Importing NuminaMath-CoT ---")
-    db = SessionLocal()
-    try:
-        dataset = load_dataset("AI-MO/NuminaMath-CoT", split="train", streaming=True)
-        
+def parse_olymmath(limit=20, start=0):
+    dataset = load_dataset("RUC-AIBOX/OlymMATH", "en-easy", split="test", streaming=True)
+
+    count = 0
+    for position, item in stream_from(dataset, start):
+        if limit and count >= limit:
+            break
+
+        problem = item.get('problem')
+        answer = item.get('answer')
+        topic = item.get('subject')
+        uid = item.get('unique_id')
+
+        if not problem or not answer:
+            continue
+
+        options, correct_label = generate_options(answer)
+
+        yield position, {
+            "source": "OlymMATH",
+            "external_id": uid,
+            "problem": problem,
+            "answer": answer,
+            "topic": topic,
+            "difficulty": 2, # Easy -> 2
+            "options": options,
+            "correct_option_label": correct_label,
+        }, item
+        count += 1
+
+def parse_numinamath(limit=20, start=0):
+    dataset = load_dataset("AI-MO/NuminaMath-CoT", split="train", streaming=True)
+
+    count = 0
+    for position, item in stream_from(dataset, start):
+        if limit and count >= limit:
+            break
+
+        messages = item.get('messages', [])
+        if len(messages) < 2:
+            continue
+
+        problem = messages[0]['content']
+        solution = messages[1]['content']
+
+        # Extract boxed answer
+        # Pattern: \boxed{answer}
+        match = re.search(r'\\boxed\{(.*?)\}', solution)
+        answer = match.group(1) if match else "See Solution"
+
+        options, correct_label = generate_options(answer)
+
+        yield position, {
+            "source": "NuminaMath-CoT",
+            "external_id": f"numina-{position}", # No ID in the dataset, use the stream position
+            "problem": problem,
+            "solution": solution,
+            "answer": answer,
+            "topic": "Math",
+            "difficulty": 4, # Competition -> 4
+            "options": options,
+            "correct_option_label": correct_label,
+        }, item
+        count += 1
+
+def parse_olympiadbench(limit=20, start=0):
+    dataset = load_dataset("math-ai/olympiadbench", split="test", streaming=True)
+
+    count = 0
+    for position, item in stream_from(dataset, start):
+        if limit and count >= limit:
+            break
+
+        if item.get('modality') != 'Text-only':
+            continue
+
+        problem = item.get('question')
+        solution_list = item.get('solution', [])
+        solution = "\n".join(solution_list) if isinstance(solution_list, list) else str(solution_list)
+
+        ans_list = item.get('final_answer', [])
+        answer = ans_list[0] if isinstance(ans_list, list) and ans_list else str(ans_list)
+
+        options, correct_label = generate_options(answer)
+
+        yield position, {
+            "source": "OlympiadBench",
+            "external_id": item.get('id'),
+            "problem": problem,
+            "solution": solution,
+            "answer": answer,
+            "topic": item.get('subfield'),
+            "difficulty": 4, # Default to 4 for now
+            "options": options,
+            "correct_option_label": correct_label,
+        }, item
+        count += 1
+
+def parse_kangaroo(dataset_name, difficulty_label, limit=20, start=0):
+    dataset = load_dataset(dataset_name, split="train", streaming=True)
+
+    def items():
         count = 0
-        for item in dataset:
-            if count >= limit:
+        for position, item in stream_from(dataset, start):
+            if limit and count >= limit:
                 break
-            
-            messages = item.get('messages', [])
-            if len(messages) < 2:
-                continue
-                
-            problem = messages[0]['content']
-            solution = messages[1]['content']
-            
-            # Extract boxed answer
-            # Pattern: \boxed{answer}
-            match = re.search(r'\\boxed\{(.*?)\}', solution)
-            answer = match.group(1) if match else "See Solution"
-            
-            options, correct_label = generate_options(answer)
-            
-            q = models.Question(
-                source="NuminaMath-CoT",
-                external_id=f"numina-{count}", # No ID in schema?
-                problem=problem,
-                solution=solution,
-                answer=answer,
-                topic="Math",
-                difficulty=4, # Competition -> 4
-                options=options,
-                correct_option_label=correct_label,
-                meta_data=item
-            )
-            db.add(q)
+            yield item.get('image'), (position, item)
             count += 1
-            
-        db.commit()
-        print(f"Imported {count} NuminaMath questions.")
-    except Exception as e:
-        print(f"Error importing NuminaMath: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
-def import_olympiadbench(limit=20):
-    print("--- Importing OlympiadBench ---")
-    db = SessionLocal()
+    # Images are stored under content-hash names by a process pool while
+    # the stream keeps being read
+    for stored, (position, item) in image_pipeline.store_images(items()):
+        problem = item.get('problem')
+        # In Kangaroo dataset, 'answer' contains the full solution/explanation
+        # and 'gold_answer' contains the correct option label (A, B, C, D, E)
+        solution = item.get('answer')
+        answer = item.get('gold_answer')
+
+        # If problem is None, use a placeholder or check user_message
+        if not problem:
+            problem = "Solve the problem shown in the image."
+
+        # Options
+        options = item.get('options')
+        if not options:
+            options = ["A", "B", "C", "D", "E"]
+
+        row = {
+            "source": difficulty_label, # Use label as source e.g. "Kangaroo 2025 (3-4)"
+            "external_id": f"kangaroo-{difficulty_label}-{position}",
+            "problem": problem,
+            "image_path": None,
+            "image_width": None,
+            "image_height": None,
+            "solution": solution,
+            "answer": answer,
+            "topic": "Math",
+            "difficulty": 3, # Kangaroo 5-6 -> 3 (Medium)
+            "options": options,
+            "correct_option_label": answer,
+        }
+        if stored:
+            row.update(stored)
+        yield position, row, {"original_problem": str(item.get('problem'))}
+
+def parse_bright(split, source_name, limit=20, start=0):
+    # Use 'examples' config and specified split
+    dataset = load_dataset("xlangai/BRIGHT", "examples", split=split, streaming=True)
+
+    count = 0
+    for position, item in stream_from(dataset, start):
+        if limit and count >= limit:
+            break
+
+        # BRIGHT structure:
+        # query: Contains the problem text and options
+        # gold_answer: Usually N/A in this dataset
+        problem = item.get('query')
+        solution = item.get('reasoning')
+        answer = item.get('gold_answer') or "N/A"
+
+        # Extract options if possible, or just leave them in the problem text
+        # The problem text often contains "(A) ... (B) ..."
+        # We'll leave them in the problem for now and provide generic options
+        options = ["A", "B", "C", "D", "E"]
+
+        yield position, {
+            "source": source_name,
+            "external_id": item.get('id'),
+            "problem": problem,
+            "solution": solution,
+            "answer": answer,
+            "topic": "General" if split == "economics" else "Coding/Math",
+            "difficulty": 5, # Hard -> 5
+            "options": options,
+            "correct_option_label": "?", # Answer not provided in dataset
+        }, item
+        count += 1
+
+# Source name -> (parser, positional args). Parsers take (limit, start) and
+# yield (stream position, question row, raw record).
+SOURCES = {
+    "OlymMATH": (parse_olymmath, ()),
+    "NuminaMath-CoT": (parse_numinamath, ()),
+    "OlympiadBench": (parse_olympiadbench, ()),
+    # "Kangaroo 2025 (3-4)": (parse_kangaroo, ("MathArena/kangaroo_2025_3-4_outputs", "Kangaroo 2025 (3-4)")), # Removed from UI
+    "Kangaroo 2025 (5-6)": (parse_kangaroo, ("MathArena/kangaroo_2025_5-6_outputs", "Kangaroo 2025 (5-6)")),
+    "BRIGHT (LeetCode)": (parse_bright, ("leetcode", "BRIGHT (LeetCode)")),
+    "BRIGHT (Economics)": (parse_bright, ("economics", "BRIGHT (Economics)")),
+}
+
+def content_hash(row, data):
+    payload = json.dumps([row, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def parse_source(name, parser, args, limit, start, batch_size, out):
+    """
+    Worker process: parse one source from a stream position and put
+    (name, batch) on the queue, then (name, None) when done or
+    (name, error message) on failure.
+    """
     try:
-        dataset = load_dataset("math-ai/olympiadbench", split="test", streaming=True)
-        
-        count = 0
-        for item in dataset:
-            if count >= limit:
-                break
-                
-            if item.get('modality') != 'Text-only':
-                continue
-                
-            problem = item.get('question')
-            solution_list = item.get('solution', [])
-            solution = "\n".join(solution_list) if isinstance(solution_list, list) else str(solution_list)
-            
-            ans_list = item.get('final_answer', [])
-            answer = ans_list[0] if isinstance(ans_list, list) and ans_list else str(ans_list)
-            
-            options, correct_label = generate_options(answer)
-            
-            q = models.Question(
-                source="OlympiadBench",
-                external_id=item.get('id'),
-                problem=problem,
-                solution=solution,
-                answer=answer,
-                topic=item.get('subfield'),
-                difficulty=4, # Default to 4 for now
-                options=options,
-                correct_option_label=correct_label,
-                meta_data=item
-            )
-            db.add(q)
-            count += 1
-            
-        db.commit()
-        print(f"Imported {count} OlympiadBench questions.")
+        batch = []
+        for position, row, data in parser(*args, limit=limit, start=start):
+            if row.get("external_id") is not None:
+                row["external_id"] = str(row["external_id"])
+            row["content_hash"] = content_hash(row, data)
+            fingerprint = near_duplicates.fingerprint(row.get("problem"), row.get("image_path"))
+            batch.append((position, row, data, fingerprint))
+            if len(batch) >= batch_size:
+                out.put((name, batch))
+                batch = []
+        if batch:
+            out.put((name, batch))
     except Exception as e:
-        print(f"Error importing OlympiadBench: {e}")
-        db.rollback()
-    finally:
-        db.close()
+        out.put((name, f"{type(e).__name__}: {e}"))
+    out.put((name, None))
 
-def import_kangaroo(dataset_name, difficulty_label, limit=20):
-    print(f"--- Importing {difficulty_label} ---")
-    db = SessionLocal()
-    
-    # Create image directory
-    img_dir = "static/questions/kangaroo"
-    os.makedirs(img_dir, exist_ok=True)
-    
-    try:
-        dataset = load_dataset(dataset_name, split="train", streaming=True)
-        
-        count = 0
-        for item in dataset:
-            if count >= limit:
-                break
-            
-            problem = item.get('problem')
-            # In Kangaroo dataset, 'answer' contains the full solution/explanation
-            # and 'gold_answer' contains the correct option label (A, B, C, D, E)
-            solution = item.get('answer') 
-            answer = item.get('gold_answer')
-            
-            # Handle image
-            image = item.get('image')
-            image_path = None
-            if image:
-                img_filename = f"kangaroo_{difficulty_label.replace(' ', '_')}_{count}.png"
-                img_full_path = os.path.join(img_dir, img_filename)
-                image.save(img_full_path)
-                image_path = f"/{img_dir}/{img_filename}"
-            
-            # If problem is None, use a placeholder or check user_message
-            if not problem:
-                problem = "Solve the problem shown in the image."
-            
-            # Options
-            options = item.get('options')
-            if not options:
-                options = ["A", "B", "C", "D", "E"] 
-            
-            q = models.Question(
-                source=difficulty_label, # Use label as source e.g. "Kangaroo 2025 (3-4)"
-                external_id=f"kangaroo-{difficulty_label}-{count}",
-                problem=problem,
-                image_path=image_path,
-                solution=solution,
-                answer=answer,
-                topic="Math",
-                difficulty=3, # Kangaroo 5-6 -> 3 (Medium)
-                options=options,
-                correct_option_label=answer,
-                meta_data={"original_problem": str(item.get('problem'))}
+def load_checkpoints(db):
+    return {c.source: c.position for c in db.query(models.ImportCheckpoint)}
+
+def write_batch(db, source, batch):
+    """
+    Upsert one batch of (position, question row, raw record, near-duplicate
+    fingerprint) on (source, external_id) and advance the source's
+    checkpoint in the same transaction. Rows whose content hash is unchanged
+    are skipped, and inserted or changed rows are clustered with their
+    near-duplicates.
+    Returns (inserted, updated, unchanged, near-duplicates).
+    """
+    # A repeated external_id within the batch keeps its last occurrence
+    keyed = {}
+    new = []
+    for _, row, data, fingerprint in batch:
+        if row.get("external_id") is None:
+            new.append((row, data, fingerprint))
+        else:
+            keyed[row["external_id"]] = (row, data, fingerprint)
+
+    existing = {}
+    if keyed:
+        existing = {
+            external_id: (qid, old_hash)
+            for qid, external_id, old_hash in db.execute(
+                select(models.Question.id, models.Question.external_id, models.Question.content_hash)
+                .where(models.Question.source == source, models.Question.external_id.in_(list(keyed)))
             )
-            db.add(q)
-            count += 1
-            
-        db.commit()
-        print(f"Imported {count} questions from {difficulty_label}.")
-    except Exception as e:
-        print(f"Error importing {difficulty_label}: {e}")
-        db.rollback()
-    finally:
-        db.close()
+        }
+
+    changed = []
+    unchanged = 0
+    for external_id, (row, data, fingerprint) in keyed.items():
+        if external_id not in existing:
+            new.append((row, data, fingerprint))
+        elif existing[external_id][1] == row["content_hash"]:
+            unchanged += 1
+        else:
+            changed.append((existing[external_id][0], row, data, fingerprint))
+
+    ids = []
+    if new:
+        ids = db.execute(
+            insert(models.Question).returning(models.Question.id, sort_by_parameter_order=True),
+            [row for row, _, _ in new],
+        ).scalars().all()
+        db.execute(
+            insert(models.QuestionRecord),
+            [{"question_id": qid, "data": data} for qid, (_, data, _) in zip(ids, new)],
+        )
+    if changed:
+        # Band buckets are computed from the text, so drop them before it changes
+        near_duplicates.remove_questions(db, [qid for qid, _, _, _ in changed])
+        db.execute(update(models.Question), [{"id": qid, **row} for qid, row, _, _ in changed])
+        records = sqlite_insert(models.QuestionRecord)
+        db.execute(
+            records.on_conflict_do_update(index_elements=["question_id"], set_={"data": records.excluded.data}),
+            [{"question_id": qid, "data": data} for qid, _, data, _ in changed],
+        )
+
+    # Keep the search index, topic links and clusters in step, in the same transaction
+    search_index.index_questions(db, list(ids) + [qid for qid, _, _, _ in changed])
+    topic_taxonomy.set_topics(db, {
+        **{qid: row.get("topic") for qid, (row, _, _) in zip(ids, new)},
+        **{qid: row.get("topic") for qid, row, _, _ in changed},
+    })
+    fingerprints = {
+        **{qid: fingerprint for qid, (_, _, fingerprint) in zip(ids, new)},
+        **{qid: fingerprint for qid, _, _, fingerprint in changed},
+    }
+    duplicates = near_duplicates.assign(db, list(fingerprints), fingerprints)
+
+    checkpoint = sqlite_insert(models.ImportCheckpoint).values(
+        source=source,
+        position=max(position for position, _, _, _ in batch) + 1,
+        updated_at=datetime.utcnow(),
+    )
+    db.execute(checkpoint.on_conflict_do_update(
+        index_elements=["source"],
+        set_={
+            # A --full rescan must not move the checkpoint backwards
+            "position": func.max(models.ImportCheckpoint.position, checkpoint.excluded.position),
+            "updated_at": checkpoint.excluded.updated_at,
+        },
+    ))
+    db.commit()
+    return len(new), len(changed), unchanged, duplicates
+
+def run_import(names, limits, full=False, batch_size=BATCH_SIZE, workers=None, sources=SOURCES):
+    """
+    Import the given sources in parallel. `limits` maps source name to the
+    maximum number of rows (0 or None for the whole dataset). Each source
+    resumes from its checkpoint unless `full` is set, in which case its whole
+    stream is re-read and changed rows are updated in place.
+    """
+    workers = workers or min(len(names), os.cpu_count() or 1)
+    stats = {
+        name: {"inserted": 0, "updated": 0, "unchanged": 0, "duplicates": 0, "error": None, "seconds": None, "write_seconds": 0.0}
+        for name in names
+    }
+    start = time.perf_counter()
 
-def import_bright(split, source_name, limit=20):
-    print(f"--- Importing {source_name} ---")
     db = SessionLocal()
     try:
-        # Use 'examples' config and specified split
-        dataset = load_dataset("xlangai/BRIGHT", "examples", split=split, streaming=True)
-        
-        count = 0
-        for item in dataset:
-            if count >= limit:
-                break
-            
-            # BRIGHT structure:
-            # query: Contains the problem text and options
-            # gold_answer: Usually N/A in this dataset
-            problem = item.get('query')
-            solution = item.get('reasoning')
-            answer = item.get('gold_answer') or "N/A"
-            
-            # Extract options if possible, or just leave them in the problem text
-            # The problem text often contains "(A) ... (B) ..."
-            # We'll leave them in the problem for now and provide generic options
-            options = ["A", "B", "C", "D", "E"]
-            
-            q = models.Question(
-                source=source_name,
-                external_id=item.get('id'),
-                problem=problem,
-                solution=solution,
-                answer=answer,
-                topic="General" if split == "economics" else "Coding/Math",
-                difficulty=5, # Hard -> 5
-                options=options,
-                correct_option_label="?", # Answer not provided in dataset
-                meta_data=item
-            )
-            db.add(q)
-            count += 1
-            
-        db.commit()
-        print(f"Imported {count} questions from {source_name}.")
-    except Exception as e:
-        print(f"Error importing {source_name}: {e}")
-        db.rollback()
+        starts = {} if full else load_checkpoints(db)
+        with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+            out = manager.Queue(maxsize=workers * 4)
+            futures = [
+                pool.submit(parse_source, name, *sources[name], limits.get(name), starts.get(name, 0), batch_size, out)
+                for name in names
+            ]
+            running = set(names)
+            while running:
+                try:
+                    name, batch = out.get(timeout=1)
+                except queue.Empty:
+                    # A worker that died without reporting would leave us waiting forever
+                    if all(f.done() for f in futures) and out.empty():
+                        break
+                    continue
+                s = stats[name]
+                if batch is None:
+                    running.discard(name)
+                    s["seconds"] = time.perf_counter() - start
+                    rows = s["inserted"] + s["updated"] + s["unchanged"]
+                    rate = rows / s["seconds"] if s["seconds"] else 0.0
+                    print(
+                        f"{name}: {s['inserted']} new, {s['updated']} changed, {s['unchanged']} unchanged, "
+                        f"{s['duplicates']} near-duplicates "
+                        f"in {s['seconds']:.1f}s ({rate:.0f} rows/s, {s['write_seconds']:.1f}s writing)."
+                    )
+                elif isinstance(batch, str):
+                    s["error"] = batch
+                    print(f"Error importing {name}: {batch}")
+                elif s["error"] is None:
+                    # After a failed batch the rest of the source is dropped so
+                    # its checkpoint never moves past rows that were not written
+                    write_start = time.perf_counter()
+                    try:
+                        inserted, updated, unchanged, duplicates = write_batch(db, name, batch)
+                        s["inserted"] += inserted
+                        s["updated"] += updated
+                        s["unchanged"] += unchanged
+                        s["duplicates"] += duplicates
+                    except Exception as e:
+                        db.rollback()
+                        s["error"] = str(e)
+                        print(f"Error importing {name}: {e}")
+                    s["write_seconds"] += time.perf_counter() - write_start
+            for f in futures:
+                f.result()
     finally:
         db.close()
 
+    elapsed = time.perf_counter() - start
+    total = sum(s["inserted"] + s["updated"] + s["unchanged"] for s in stats.values())
+    print(f"Processed {total} questions in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s).")
+    return stats
+
+def import_olymmath(limit=20, full=False):
+    return run_import(["OlymMATH"], {"OlymMATH": limit}, full=full)
+
+def import_numinamath(limit=20, full=False):
+    return run_import(["NuminaMath-CoT"], {"NuminaMath-CoT": limit}, full=full)
+
+def import_olympiadbench(limit=20, full=False):
+    return run_import(["OlympiadBench"], {"OlympiadBench": limit}, full=full)
+
+def import_kangaroo(dataset_name, difficulty_label, limit=20, full=False):
+    sources = {difficulty_label: (parse_kangaroo, (dataset_name, difficulty_label))}
+    return run_import([difficulty_label], {difficulty_label: limit}, full=full, sources=sources)
+
+def import_bright(split, source_name, limit=20, full=False):
+    sources = {source_name: (parse_bright, (split, source_name))}
+    return run_import([source_name], {source_name: limit}, full=full, sources=sources)
+
+def parse_source_limits(values):
+    limits = {}
+    for value in values:
+        name, _, limit = value.rpartition("=")
+        if not name or name not in SOURCES:
+            raise argparse.ArgumentTypeError(f"Expected SOURCE=N with a known source, got {value!r}")
+        limits[name] = int(limit)
+    return limits
+
 if __name__ == "__main__":
-    clear_data() # Clear all for fresh start
-    import_olymmath()
-    import_numinamath()
-    import_olympiadbench()
-    # import_kangaroo("MathArena/kangaroo_2025_3-4_outputs", "Kangaroo 2025 (3-4)") # Removed from UI
-    import_kangaroo("MathArena/kangaroo_2025_5-6_outputs", "Kangaroo 2025 (5-6)")
-    
-    # Import BRIGHT splits
-    import_bright("leetcode", "BRIGHT (LeetCode)")
-    import_bright("economics", "BRIGHT (Economics)")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", nargs="+", choices=list(SOURCES), default=list(SOURCES),
+                        help="sources to import (default: all)")
+    parser.add_argument("--limit", type=int, default=20, help="rows per source, 0 for the whole dataset")
+    parser.add_argument("--source-limit", nargs="*", default=[], metavar="SOURCE=N",
+                        help="per-source override of --limit")
+    parser.add_argument("--full", action="store_true",
+                        help="re-read each source from the start instead of its checkpoint, updating changed rows")
+    parser.add_argument("--clear", action="store_true",
+                        help="delete the sources' questions and checkpoints first (orphans existing attempts)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per insert transaction")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: one per source, up to the CPU count)")
+    args = parser.parse_args()
+
+    limits = {name: args.limit for name in args.sources}
+    limits.update(parse_source_limits(args.source_limit))
+
+    migrate.upgrade()
+    if args.clear:
+        if set(args.sources) == set(SOURCES):
+            clear_data()
+        else:
+            for name in args.sources:
+                clear_data(name)
+    run_import(args.sources, limits, full=args.full, batch_size=args.batch_size, workers=args.workers)
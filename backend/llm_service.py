@@ -1,13 +1,15 @@
-import requests
-import json
+import asyncio
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+import httpx
 
-def get_hint_from_ollama(question_text: str, model: str = "gemma3:latest") -> str:
-    """
-    Calls local Ollama instance to generate a hint for the math problem.
-    """
-    prompt = f"""You are a helpful math tutor. 
+import hint_cache
+from ollama_client import OllamaBusy, client
+
+# Bump when the prompt below changes so cached hints are regenerated
+HINT_PROMPT_VERSION = 1
+
+def build_hint_prompt(question_text: str) -> str:
+    return f"""You are a helpful math tutor. 
     The student is stuck on the following problem:
     "{question_text}"
     
@@ -15,50 +17,60 @@ def get_hint_from_ollama(question_text: str, model: str = "gemma3:latest") -> st
     DO NOT reveal the final answer. 
     Keep the hint concise and encouraging.
     """
-    
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False
-    }
-    
-    try:
-        response = requests.post(OLLAMA_URL, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("response", "Sorry, I couldn't generate a hint at this time.")
-    except requests.exceptions.ConnectionError:
-        return "Error: Could not connect to Ollama. Is it running on port 11434?"
-    except Exception as e:
-        return f"Error generating hint: {str(e)}"
 
-def get_hint_stream(question_text: str, model: str = "gemma3:latest"):
+def hint_key(question_text: str, model: str) -> str:
+    return hint_cache.cache_key(model, HINT_PROMPT_VERSION, question_text)
+
+def error_message(e: Exception) -> str:
+    if isinstance(e, httpx.ConnectError):
+        return f"Error: Could not connect to Ollama. Is it running at {client.base_url}?"
+    return f"Error generating hint: {str(e)}"
+
+def _store(key: str, model: str):
+    async def store(chunks):
+        await asyncio.to_thread(hint_cache.cache.put, key, model, HINT_PROMPT_VERSION, chunks)
+    return store
+
+async def generate_hint(question_text: str, model: str = "gemma3:latest", ollama=client) -> str:
     """
-    Calls local Ollama instance and yields chunks of the hint for streaming.
+    Generates a hint with Ollama and stores it in the hint cache, raising on
+    failure. Used by get_hint on a cache miss and by pregenerate_hints.py.
     """
-    prompt = f"""You are a helpful math tutor. 
-    The student is stuck on the following problem:
-    "{question_text}"
-    
-    Please provide a helpful hint to guide them towards the solution. 
-    DO NOT reveal the final answer. 
-    Keep the hint concise and encouraging.
+    key = hint_key(question_text, model)
+    return await ollama.generate(key, model, build_hint_prompt(question_text), on_complete=_store(key, model))
+
+async def get_hint(question_text: str, model: str = "gemma3:latest") -> str:
     """
-    
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": True
-    }
-    
+    Returns a hint for the math problem, from the cache or the local Ollama
+    instance. Raises OllamaBusy when too many generations are queued.
+    """
+    key = hint_key(question_text, model)
+    cached = await asyncio.to_thread(hint_cache.cache.get, key)
+    if cached is not None:
+        return "".join(cached)
+
     try:
-        response = requests.post(OLLAMA_URL, json=payload, stream=True)
-        response.raise_for_status()
-        for line in response.iter_lines():
-            if line:
-                chunk = json.loads(line)
-                yield chunk.get("response", "")
-                if chunk.get("done", False):
-                    break
+        hint = await generate_hint(question_text, model)
+    except OllamaBusy:
+        raise
     except Exception as e:
-        yield f"Error generating hint: {str(e)}"
+        return error_message(e)
+    return hint or "Sorry, I couldn't generate a hint at this time."
+
+async def open_hint_stream(question_text: str, model: str = "gemma3:latest"):
+    """
+    Returns (chunks, cached): an async iterator over the chunks of a hint and
+    whether it is replayed from the cache. A generation is only cached once
+    the model reports it is done. Raises OllamaBusy before streaming starts
+    when too many generations are queued; errors during generation are
+    raised from the iterator.
+    """
+    key = hint_key(question_text, model)
+    cached = await asyncio.to_thread(hint_cache.cache.get, key)
+    if cached is not None:
+        return _replay(cached), True
+    return client.stream(key, model, build_hint_prompt(question_text), on_complete=_store(key, model)), False
+
+async def _replay(chunks):
+    for chunk in chunks:
+        yield chunk
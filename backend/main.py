@@ -1,13 +1,12 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import models
-from database import engine
-from routers import questions
+from routers import questions, concepts, search
+from static_files import CachedStaticFiles
+import hashlib
 import os
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
+# Tables are created and upgraded by migrate.py at deploy time
 
 app = FastAPI(title="Math Practice App")
 
@@ -18,21 +17,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Mount static files
+# Mount static files (fingerprinted names are cached as immutable)
 os.makedirs("static/questions", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
 
 # Include routers
 # app.include_router(pdfs.router, tags=["pdfs"])
 app.include_router(questions.router, tags=["questions"])
+app.include_router(concepts.router, tags=["concepts"])
+app.include_router(search.router, tags=["search"])
 
 # --- User Management & Seeding ---
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, Query, Response
+from datetime import datetime
+from typing import Optional
+from database import get_db, get_async_db, get_async_read_db
 import schemas
+import attempt_writer
+import user_stats
 
 @app.on_event("startup")
 def seed_users():
@@ -52,47 +60,124 @@ def seed_users():
         db.close()
 
 @app.get("/users", response_model=list[schemas.User])
-def get_users(db: Session = Depends(get_db)):
-    return db.query(models.User).all()
+async def get_users(db: AsyncSession = Depends(get_async_read_db)):
+    return (await db.scalars(select(models.User))).all()
 
 from fastapi import UploadFile, File
-import shutil
 
 @app.post("/users/{user_id}/avatar")
-async def upload_avatar(user_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+async def upload_avatar(user_id: int, file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Create avatars directory
     os.makedirs("static/avatars", exist_ok=True)
     
-    # Save file
-    file_extension = os.path.splitext(file.filename)[1]
-    filename = f"avatar_{user_id}{file_extension}"
+    # Save file under a content fingerprint so the URL changes with the
+    # image and browsers can cache it forever
+    content = await file.read()
+    file_extension = os.path.splitext(file.filename or "")[1].lower()
+    fingerprint = hashlib.sha256(content).hexdigest()[:16]
+    filename = f"avatar_{user_id}_{fingerprint}{file_extension}"
     file_path = f"static/avatars/{filename}"
     
     with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+        buffer.write(content)
         
     # Update user
+    previous = user.avatar_url
     user.avatar_url = f"/static/avatars/{filename}"
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+
+    # Remove the replaced file; its URL is no longer handed out
+    if previous and previous != user.avatar_url and previous.startswith("/static/avatars/"):
+        try:
+            os.remove(previous.lstrip("/"))
+        except OSError:
+            pass
     
     return {"avatar_url": user.avatar_url}
 
-@app.post("/attempts", response_model=schemas.Attempt)
-def create_attempt(attempt: schemas.AttemptCreate, db: Session = Depends(get_db)):
-    db_attempt = models.Attempt(**attempt.dict())
-    db.add(db_attempt)
-    db.commit()
-    db.refresh(db_attempt)
-    return db_attempt
+@app.on_event("startup")
+async def start_attempt_writer():
+    if attempt_writer.WRITE_BEHIND:
+        await attempt_writer.writer.start()
+
+@app.on_event("shutdown")
+async def stop_attempt_writer():
+    # Commits everything still queued before the process exits
+    await attempt_writer.writer.stop()
 
-@app.get("/users/{user_id}/history", response_model=list[schemas.Attempt])
-def get_user_history(user_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Attempt).filter(models.Attempt.user_id == user_id).all()
+async def save_attempts(rows, db):
+    if attempt_writer.writer.running:
+        return await attempt_writer.writer.submit(rows)
+    return await attempt_writer.insert_attempts(db, rows)
+
+@app.post("/attempts", response_model=schemas.Attempt)
+async def create_attempt(attempt: schemas.AttemptCreate, db: AsyncSession = Depends(get_async_db)):
+    saved = await save_attempts([attempt.dict()], db)
+    return saved[0]
+
+@app.post("/attempts/bulk", response_model=list[schemas.Attempt])
+async def create_attempts_bulk(bulk: schemas.AttemptBulkCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Record a batch of attempts (e.g. a finished Challenge Mode session) in one
+    transaction.
+    """
+    if not bulk.attempts:
+        return []
+    return await save_attempts([a.dict() for a in bulk.attempts], db)
+
+@app.get("/metrics/attempts")
+def get_attempt_metrics():
+    return attempt_writer.writer.metrics()
+
+@app.get("/users/{user_id}/history", response_model=list[schemas.AttemptHistory])
+async def get_user_history(
+    user_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    before_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    is_correct: Optional[bool] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    A user's attempts, newest first. Pass the X-Next-Cursor header of a
+    response as before_id to get the next page.
+    """
+    query = (
+        select(models.Attempt)
+        .options(
+            joinedload(models.Attempt.question).load_only(
+                models.Question.id,
+                models.Question.source,
+                models.Question.problem,
+                models.Question.difficulty,
+                models.Question.correct_option_label,
+            )
+        )
+        .where(models.Attempt.user_id == user_id)
+    )
+    if before_id is not None:
+        query = query.where(models.Attempt.id < before_id)
+    if since is not None:
+        query = query.where(models.Attempt.timestamp >= since)
+    if until is not None:
+        query = query.where(models.Attempt.timestamp <= until)
+    if is_correct is not None:
+        query = query.where(models.Attempt.is_correct == is_correct)
+
+    attempts = (await db.scalars(query.order_by(models.Attempt.id.desc()).limit(limit))).all()
+    if len(attempts) == limit:
+        response.headers["X-Next-Cursor"] = str(attempts[-1].id)
+    return attempts
+
+@app.get("/users/{user_id}/stats", response_model=schemas.UserStats)
+async def get_user_stats(user_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    return await user_stats.get_stats(db, user_id)
 
 @app.get("/")
 def read_root():
@@ -100,17 +185,46 @@ def read_root():
 
 # --- AI Hints ---
 import llm_service
+import hint_cache
+import ollama_client
+import hint_stream
+import asyncio
+import time
+from fastapi import Request
+
+def hint_service_busy():
+    return HTTPException(status_code=503, detail="Hint service is busy, try again shortly", headers={"Retry-After": "5"})
 
 @app.post("/hint")
-def get_hint(request: schemas.HintRequest):
-    hint = llm_service.get_hint_from_ollama(request.question_text, request.model)
+async def get_hint(request: schemas.HintRequest):
+    try:
+        hint = await llm_service.get_hint(request.question_text, request.model)
+    except ollama_client.OllamaBusy:
+        raise hint_service_busy()
     return {"hint": hint}
 
-from fastapi.responses import StreamingResponse
+@app.get("/metrics/hints")
+async def get_hint_metrics():
+    return {
+        "cache": await asyncio.to_thread(hint_cache.cache.metrics),
+        "ollama": ollama_client.client.metrics(),
+        "streams": hint_stream.stats.metrics(),
+    }
+
+@app.on_event("shutdown")
+async def close_ollama_client():
+    await ollama_client.client.close()
 
 @app.post("/hint/stream")
-def get_hint_stream(request: schemas.HintRequest):
-    return StreamingResponse(
-        llm_service.get_hint_stream(request.question_text, request.model), 
-        media_type="text/plain"
-    )
+async def get_hint_stream(request: schemas.HintRequest, http_request: Request, format: Optional[str] = None):
+    """
+    Streams a hint as plain text, or as server-sent events with ?format=sse
+    (or Accept: text/event-stream). Disconnecting cancels the generation.
+    """
+    started = time.perf_counter()
+    sse = format == "sse" or "text/event-stream" in http_request.headers.get("accept", "")
+    try:
+        chunks, cached = await llm_service.open_hint_stream(request.question_text, request.model)
+    except ollama_client.OllamaBusy:
+        raise hint_service_busy()
+    return hint_stream.HintStream(chunks, sse=sse, cached=cached, started=started)
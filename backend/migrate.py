@@ -0,0 +1,287 @@
+"""
+Schema migrations for the app database. Run at deploy time, before starting
+the API workers:
+
+    python migrate.py                # upgrade to the latest version
+    python migrate.py --status       # show current and latest version
+    python migrate.py --check-plans  # assert the router queries use indexes
+
+The schema version is kept in SQLite's PRAGMA user_version. Each migration
+runs in its own transaction and must be safe on a database that create_all
+already brought up to date (fresh installs get every table and index from
+the baseline).
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, inspect, select
+from sqlalchemy.orm import Session
+
+import database
+import models
+import near_duplicates
+import search_index
+import topic_taxonomy
+import user_stats
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def current_version(conn):
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def latest_version():
+    return max(version for version, _, _ in MIGRATIONS)
+
+
+def upgrade(engine=None, target=None):
+    engine = engine or database.engine
+    target = target or latest_version()
+    applied = []
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version > target:
+            break
+        with engine.begin() as conn:
+            # Re-read inside the transaction in case another deploy ran it
+            if current_version(conn) >= version:
+                continue
+            print(f"Applying migration {version}: {description}")
+            fn(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+            applied.append(version)
+    return applied
+
+
+def _columns(conn, table):
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _create_indexes(conn, table, names=None):
+    for index in table.indexes:
+        if names is None or index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+# --- Migrations ---
+
+@migration(1, "baseline tables")
+def baseline(conn):
+    models.Base.metadata.create_all(conn)
+
+
+@migration(2, "move questions.meta_data into question_records")
+def move_raw_records(conn):
+    if "meta_data" not in _columns(conn, "questions"):
+        return
+    records = models.QuestionRecord.__table__
+    rows = conn.exec_driver_sql(
+        "SELECT id, meta_data FROM questions WHERE meta_data IS NOT NULL"
+    )
+    batch = []
+    for question_id, meta_data in rows:
+        batch.append({"question_id": question_id, "data": json.loads(meta_data)})
+        if len(batch) >= 1000:
+            conn.execute(records.insert().prefix_with("OR IGNORE"), batch)
+            batch = []
+    if batch:
+        conn.execute(records.insert().prefix_with("OR IGNORE"), batch)
+
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        conn.exec_driver_sql("ALTER TABLE questions DROP COLUMN meta_data")
+    else:
+        conn.exec_driver_sql("UPDATE questions SET meta_data = NULL")
+
+
+@migration(3, "backfill user_stats rollups")
+def backfill_user_stats(conn):
+    db = Session(bind=conn)
+    try:
+        if user_stats.needs_rebuild(db):
+            user_stats.rebuild(db)
+            db.flush()
+    finally:
+        db.close()
+
+
+@migration(4, "composite indexes for session, history and attempt queries")
+def composite_indexes(conn):
+    _create_indexes(conn, models.Question.__table__, {
+        "ix_questions_active_source_difficulty",
+        "ix_questions_active_id",
+    })
+    _create_indexes(conn, models.Attempt.__table__)
+
+
+@migration(5, "unique (source, external_id), content hashes and import checkpoints")
+def import_identity(conn):
+    if "content_hash" not in _columns(conn, "questions"):
+        conn.exec_driver_sql("ALTER TABLE questions ADD COLUMN content_hash VARCHAR")
+
+    # Collapse duplicates left by repeated imports onto the oldest row, moving
+    # their attempts over so no history is lost
+    duplicates = conn.exec_driver_sql(
+        "SELECT q.id, keep.id FROM questions q "
+        "JOIN (SELECT source, external_id, MIN(id) AS id FROM questions "
+        "      WHERE external_id IS NOT NULL "
+        "      GROUP BY source, external_id HAVING COUNT(*) > 1) keep "
+        "  ON q.source IS keep.source AND q.external_id = keep.external_id "
+        "WHERE q.id != keep.id"
+    ).all()
+    for duplicate_id, keep_id in duplicates:
+        conn.exec_driver_sql("UPDATE attempts SET question_id = ? WHERE question_id = ?", (keep_id, duplicate_id))
+        conn.exec_driver_sql("DELETE FROM question_records WHERE question_id = ?", (duplicate_id,))
+        conn.exec_driver_sql("DELETE FROM questions WHERE id = ?", (duplicate_id,))
+    if duplicates:
+        print(f"  Merged {len(duplicates)} duplicate questions")
+
+    _create_indexes(conn, models.Question.__table__, {"ux_questions_source_external_id"})
+    models.ImportCheckpoint.__table__.create(conn, checkfirst=True)
+
+
+@migration(6, "question image dimensions")
+def image_dimensions(conn):
+    columns = _columns(conn, "questions")
+    for column in ("image_width", "image_height"):
+        if column not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE questions ADD COLUMN {column} INTEGER")
+
+
+
+@migration(7, "full-text search index")
+def search_index_table(conn):
+    count = search_index.rebuild_questions(conn)
+    print(f"  Indexed {count} questions for search")
+
+
+@migration(8, "normalized topics")
+def topics(conn):
+    models.Topic.__table__.create(conn, checkfirst=True)
+    models.QuestionTopic.__table__.create(conn, checkfirst=True)
+    count = topic_taxonomy.backfill(conn)
+    print(f"  Added {count} topic links")
+
+
+@migration(9, "near-duplicate clusters")
+def near_duplicate_clusters(conn):
+    if "cluster_id" not in _columns(conn, "questions"):
+        conn.exec_driver_sql("ALTER TABLE questions ADD COLUMN cluster_id INTEGER")
+    _create_indexes(conn, models.Question.__table__, {"ix_questions_cluster_id"})
+    models.QuestionBand.__table__.create(conn, checkfirst=True)
+    db = Session(bind=conn)
+    try:
+        count, joined = near_duplicates.rebuild(db)
+        db.flush()
+    finally:
+        db.close()
+    print(f"  Clustered {count} questions, {joined} matched a near-duplicate")
+
+
+@migration(10, "weighted search ranking")
+def search_ranking(conn):
+    search_index.create(conn)
+
+# --- Query plan checks ---
+
+def router_queries():
+    """
+    The query shapes issued by the routers, with the index each must use.
+    """
+    Q = models.Question
+    A = models.Attempt
+    QT = models.QuestionTopic
+    day = datetime(2025, 1, 1)
+    return [
+        ("list_questions", "INTEGER PRIMARY KEY",
+         select(Q.id, Q.source, Q.problem).where(Q.id > 100).order_by(Q.id).limit(100)),
+        ("list_active_questions", "INDEX ix_questions_active_id",
+         select(Q.id, Q.source, Q.problem).where(Q.is_active == True, Q.id > 100).order_by(Q.id).limit(100)),
+        ("fetch_questions", "INTEGER PRIMARY KEY",
+         select(Q).where(Q.id.in_([1, 2, 3]))),
+        ("question_index_rebuild", "COVERING INDEX ix_questions_active_source_difficulty",
+         select(Q.id, Q.source, Q.difficulty, Q.is_active)),
+        ("question_index_clusters", "COVERING INDEX ix_questions_cluster_id",
+         select(Q.id, Q.cluster_id).where(Q.cluster_id != Q.id)),
+        ("question_index_topic_fingerprint", "COVERING INDEX sqlite_autoindex_question_topics_1",
+         select(func.count(), func.sum(QT.question_id * QT.topic_id)).where(QT.question_id <= 100)),
+        ("question_raw", "PRIMARY KEY",
+         select(models.QuestionRecord).where(models.QuestionRecord.question_id == 1)),
+        ("attempted_set", "COVERING INDEX ix_attempts_user_question",
+         select(A.question_id).where(A.user_id == 1).distinct()),
+        ("history", "INDEX ix_attempts_user_recent",
+         select(A).where(A.user_id == 1).order_by(A.id.desc()).limit(50)),
+        ("history_next_page", "INDEX ix_attempts_user_recent",
+         select(A).where(A.user_id == 1, A.id < 500).order_by(A.id.desc()).limit(50)),
+        ("history_time_range", "INDEX ix_attempts_user_timestamp",
+         select(A).where(A.user_id == 1, A.timestamp >= day, A.timestamp <= day).order_by(A.id.desc()).limit(50)),
+        ("user_stats", "INDEX sqlite_autoindex_user_stats",
+         select(models.UserStat).where(models.UserStat.user_id == 1)),
+    ]
+
+
+def explain(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = [compiled.params[name] for name in compiled.positiontup]
+    params = tuple(p.isoformat(" ") if isinstance(p, datetime) else p for p in params)
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans(engine):
+    """
+    Returns a list of (name, plan, problem) for every query that does not use
+    its expected index or falls back to a full table scan.
+    """
+    failures = []
+    with engine.connect() as conn:
+        for name, expected, stmt in router_queries():
+            plan = explain(conn, stmt)
+            text = " | ".join(plan)
+            bare_scans = [step for step in plan if step.startswith("SCAN ") and " USING " not in step]
+            if bare_scans:
+                failures.append((name, text, "full table scan"))
+            elif expected not in text:
+                failures.append((name, text, f"expected {expected}"))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="print schema versions and exit")
+    parser.add_argument("--check-plans", action="store_true",
+                        help="build a scratch database through the migrations and check query plans")
+    args = parser.parse_args()
+
+    if args.status:
+        with database.engine.connect() as conn:
+            print(f"Current version: {current_version(conn)}, latest: {latest_version()}")
+        return
+
+    if args.check_plans:
+        scratch = create_engine("sqlite://")
+        upgrade(scratch)
+        failures = check_query_plans(scratch)
+        for name, plan, problem in failures:
+            print(f"FAIL {name}: {problem}\n     {plan}")
+        if failures:
+            sys.exit(1)
+        print(f"All {len(router_queries())} router queries use their indexes.")
+        return
+
+    applied = upgrade()
+    if not applied:
+        print("Database is up to date.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,40 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, JSON, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, JSON, DateTime, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
+import json
+import zlib
 from database import Base
 
+class CompressedJSON(TypeDecorator):
+    """
+    JSON stored as a zlib-compressed blob.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(json.dumps(value, default=str).encode("utf-8"))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return json.loads(zlib.decompress(value).decode("utf-8"))
+
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        # Session filters; also covers the in-memory question index rebuild
+        Index("ix_questions_active_source_difficulty", "is_active", "source", "difficulty"),
+        # Keyset pages of active questions (ORDER BY id)
+        Index("ix_questions_active_id", "is_active", "id"),
+        # Re-imports upsert on the dataset's own identity
+        Index("ux_questions_source_external_id", "source", "external_id", unique=True),
+        # Merging near-duplicate clusters relabels every member
+        Index("ix_questions_cluster_id", "cluster_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     # Unified Schema
@@ -13,6 +43,8 @@ class Question(Base):
     
     problem = Column(String, nullable=True) # The question text (nullable for image-only)
     image_path = Column(String, nullable=True) # Path to question image
+    image_width = Column(Integer, nullable=True) # Size of the image at image_path
+    image_height = Column(Integer, nullable=True)
     solution = Column(String, nullable=True) # Step-by-step solution/CoT
     answer = Column(String, nullable=True) # Final answer
     
@@ -22,13 +54,69 @@ class Question(Base):
     options = Column(JSON, nullable=True) # For MCQs
     correct_option_label = Column(String, nullable=True) # For MCQs
     
-    meta_data = Column(JSON, nullable=True) # Original record
-    
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    content_hash = Column(String, nullable=True) # Hash of the imported row, unchanged rows are skipped
+    cluster_id = Column(Integer, nullable=True) # Lowest question ID among its near-duplicates (see near_duplicates.py)
+
+    # Original dataset record, kept out of the hot row and only loaded on access
+    raw_record = relationship("QuestionRecord", uselist=False, cascade="all, delete-orphan")
 
     # pdf relationship removed
 
+class QuestionRecord(Base):
+    __tablename__ = "question_records"
+
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+    data = Column(CompressedJSON, nullable=True) # Original record
+
+class ImportCheckpoint(Base):
+    """
+    How far into each source's dataset stream the importer has read.
+    """
+    __tablename__ = "import_checkpoints"
+
+    source = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False, default=0) # Next stream index to read
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Topic(Base):
+    """
+    A normalized topic, e.g. "number-theory" for "Number Theory" or "NT".
+    """
+    __tablename__ = "topics"
+
+    id = Column(Integer, primary_key=True)
+    slug = Column(String, unique=True, nullable=False)
+    name = Column(String, nullable=False) # Display name
+
+class QuestionTopic(Base):
+    """
+    Many-to-many link between questions and topics. origin records who added
+    the link ("import" for dataset subjects, "curriculum" for generated
+    concepts) so each can be replaced without touching the other.
+    """
+    __tablename__ = "question_topics"
+    __table_args__ = (
+        # Questions per topic, for the in-memory topic sets
+        Index("ix_question_topics_topic_question", "topic_id", "question_id"),
+    )
+
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+    topic_id = Column(Integer, ForeignKey("topics.id"), primary_key=True)
+    origin = Column(String, primary_key=True)
+
+class QuestionBand(Base):
+    """
+    LSH band buckets of each question's MinHash signature; questions sharing
+    a bucket are near-duplicate candidates.
+    """
+    __tablename__ = "question_bands"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    bucket = Column(Integer, primary_key=True) # Signed 64-bit hash of (band, signature values)
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -41,6 +129,12 @@ class User(Base):
 
 class Attempt(Base):
     __tablename__ = "attempts"
+    __table_args__ = (
+        Index("ix_attempts_user_question", "user_id", "question_id"),
+        Index("ix_attempts_user_timestamp", "user_id", "timestamp"),
+        # Newest-first history pages (ORDER BY id within a user)
+        Index("ix_attempts_user_recent", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -52,3 +146,19 @@ class Attempt(Base):
 
     user = relationship("User", back_populates="attempts")
     question = relationship("Question")
+
+class UserStat(Base):
+    """
+    Per-user attempt totals by (source, difficulty), maintained incrementally
+    as attempts are written. Unknown source/difficulty are stored as "" and 0.
+    """
+    __tablename__ = "user_stats"
+    __table_args__ = (UniqueConstraint("user_id", "source", "difficulty"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    source = Column(String, nullable=False, default="")
+    difficulty = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+    time_taken = Column(Integer, nullable=False, default=0) # Total seconds
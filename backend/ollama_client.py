@@ -0,0 +1,219 @@
+"""
+Async client for Ollama's /api/generate.
+
+One pooled httpx.AsyncClient is shared by all requests (keep-alive, explicit
+timeouts). At most MATH_OLLAMA_MAX_CONCURRENCY generations run upstream at
+once; further generations wait in a queue of at most MATH_OLLAMA_MAX_QUEUE,
+and beyond that OllamaBusy is raised so the API can answer 503 instead of
+piling up work.
+
+Identical requests that arrive while a generation is in flight share it
+("singleflight"): every caller follows the same stream of chunks, late
+joiners first replaying what was already produced. The upstream generation
+is cancelled once the last caller goes away.
+
+Point MATH_OLLAMA_URL at fake_ollama.py to run without a model.
+"""
+import asyncio
+import json
+import os
+
+import httpx
+
+OLLAMA_URL = os.environ.get("MATH_OLLAMA_URL", "http://localhost:11434")
+MAX_CONCURRENCY = int(os.environ.get("MATH_OLLAMA_MAX_CONCURRENCY", 4))
+MAX_QUEUE = int(os.environ.get("MATH_OLLAMA_MAX_QUEUE", 32))
+CONNECT_TIMEOUT = float(os.environ.get("MATH_OLLAMA_CONNECT_TIMEOUT", 5))
+# Longest wait for the next chunk; a cold model load can take a while
+READ_TIMEOUT = float(os.environ.get("MATH_OLLAMA_READ_TIMEOUT", 120))
+
+
+class OllamaError(Exception):
+    pass
+
+
+class OllamaBusy(OllamaError):
+    """
+    Raised when the generation queue is full.
+    """
+
+
+class _Flight:
+    """
+    One upstream generation and the chunks it has produced so far.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def append(self, chunk):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error=None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def follow(self):
+        position = 0
+        while True:
+            while position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class OllamaClient:
+    def __init__(self, base_url=OLLAMA_URL, max_concurrency=MAX_CONCURRENCY, max_queue=MAX_QUEUE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, transport=None):
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.transport = transport
+        self._client = None
+        self._semaphore = None
+        self._flights = {}
+        self._queued = 0
+
+        # Metrics
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.cancelled = 0
+        self.in_flight = 0
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+                transport=self.transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def close(self):
+        for flight in list(self._flights.values()):
+            flight.task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stream(self, key, model, prompt, on_complete=None):
+        """
+        Return an async iterator over the generated chunks. Callers passing
+        the same key while a generation is in flight share it. `on_complete`
+        is awaited with the full chunk list after a successful generation.
+        Raises OllamaBusy immediately if the queue is full.
+        """
+        self._http()
+        self.requests += 1
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            if self.in_flight + self._queued >= self.max_concurrency + self.max_queue:
+                self.rejected += 1
+                raise OllamaBusy("Too many hint requests in progress")
+            self._queued += 1
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, model, prompt, on_complete))
+        # Counted now rather than on the first read: a caller that has not
+        # started reading yet (e.g. a response whose headers are still being
+        # sent) must keep the generation alive if another caller leaves
+        flight.subscribers += 1
+        return self._subscribe(flight)
+
+    async def generate(self, key, model, prompt, on_complete=None):
+        chunks = self.stream(key, model, prompt, on_complete)
+        return "".join([chunk async for chunk in chunks])
+
+    async def _subscribe(self, flight):
+        try:
+            async for chunk in flight.follow():
+                yield chunk
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+
+    async def _run(self, key, flight, model, prompt, on_complete):
+        queued = True
+        try:
+            async with self._semaphore:
+                self._queued -= 1
+                queued = False
+                self.in_flight += 1
+                self.upstream_calls += 1
+                try:
+                    payload = {"model": model, "prompt": prompt, "stream": True}
+                    async with self._http().stream("POST", "/api/generate", json=payload) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            data = json.loads(line)
+                            if data.get("error"):
+                                raise OllamaError(data["error"])
+                            if data.get("response"):
+                                flight.append(data["response"])
+                            if data.get("done"):
+                                break
+                finally:
+                    self.in_flight -= 1
+            flight.finish()
+            if on_complete is not None and flight.chunks:
+                await on_complete(flight.chunks)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            flight.finish(OllamaError("Generation cancelled"))
+            raise
+        except Exception as e:
+            if flight.done:
+                # Generation succeeded; only on_complete failed
+                print(f"Error storing generation: {e}")
+            else:
+                self.upstream_errors += 1
+                flight.finish(e)
+        finally:
+            if queued:
+                self._queued -= 1
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def metrics(self):
+        return {
+            "url": self.base_url,
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+            "cancelled": self.cancelled,
+            "in_flight": self.in_flight,
+            "queued": self._queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+client = OllamaClient()
@@ -0,0 +1,138 @@
+"""
+Generate hints ahead of time so /hint and /hint/stream are usually a cache
+lookup instead of a live generation.
+
+Walks the active questions, most attempted first, and generates a hint for
+each one that is not cached yet, with at most --concurrency generations
+running against Ollama at once. Hints go into the same cache the API reads
+from (hint_cache.db), each one as soon as it finishes, so an interrupted run
+picks up where it stopped when started again:
+
+    python pregenerate_hints.py                        # every active question
+    python pregenerate_hints.py --limit 500            # the 500 most attempted uncached questions
+    python pregenerate_hints.py --source OlymMATH --model deepseek-r1
+
+The cache keeps MATH_HINT_CACHE_MAX_PER_MODEL hints per model (or the
+model's entry in MATH_HINT_CACHE_MODEL_LIMITS). Each stored hint counts as
+just used, so a run past that limit would evict its own most attempted
+hints first; instead only as many are generated as still fit next to the
+cached ones. Raise the limit to pre-generate more.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import func
+
+import hint_cache
+import llm_service
+import models
+from database import SessionLocal
+from ollama_client import OllamaClient
+
+DEFAULT_MODEL = "gemma3:latest"
+
+
+def questions_by_attempts(source=None):
+    """
+    Return the distinct problem texts of active questions, most attempted
+    first. Image-only questions have no text to key a hint on and are skipped.
+    """
+    db = SessionLocal()
+    try:
+        attempts = func.count(models.Attempt.id)
+        query = (
+            db.query(models.Question.problem, attempts)
+            .outerjoin(models.Attempt, models.Attempt.question_id == models.Question.id)
+            .filter(models.Question.is_active == True, models.Question.problem.isnot(None))
+            .group_by(models.Question.id)
+            .order_by(attempts.desc(), models.Question.id)
+        )
+        if source:
+            query = query.filter(models.Question.source == source)
+        seen = set()
+        problems = []
+        for problem, _ in query:
+            if problem.strip() and problem not in seen:
+                seen.add(problem)
+                problems.append(problem)
+        return problems
+    finally:
+        db.close()
+
+
+def pending_problems(problems, model, limit=0):
+    """
+    (problems still to generate, number already cached, number skipped
+    because the cache is full). The pending list keeps the given priority
+    order and is cut to the room left in the model's cache, so a run never
+    evicts its own more valuable hints.
+    """
+    keys = {problem: llm_service.hint_key(problem, model) for problem in problems}
+    cached = hint_cache.cache.cached_keys(keys.values())
+    pending = [problem for problem in problems if keys[problem] not in cached]
+    if limit:
+        pending = pending[:limit]
+    room = max(hint_cache.cache.limit_for(model) - len(cached), 0)
+    return pending[:room], len(cached), max(len(pending) - room, 0)
+
+
+async def pregenerate(problems, model, concurrency):
+    ollama = OllamaClient(max_concurrency=concurrency, max_queue=concurrency)
+    queue = asyncio.Queue()
+    for problem in problems:
+        queue.put_nowait(problem)
+
+    done = 0
+    failed = 0
+    started = time.perf_counter()
+
+    async def worker():
+        nonlocal done, failed
+        while not queue.empty():
+            problem = queue.get_nowait()
+            try:
+                await llm_service.generate_hint(problem, model, ollama=ollama)
+            except Exception as e:
+                failed += 1
+                print(f"Failed: {llm_service.error_message(e)}")
+            done += 1
+            if done % 25 == 0 or done == len(problems):
+                elapsed = time.perf_counter() - started
+                print(f"{done}/{len(problems)} hints, {failed} failed, {done / elapsed:.2f} hints/s")
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        await ollama.close()
+    return done - failed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"Ollama model (default: {DEFAULT_MODEL})")
+    parser.add_argument("--concurrency", type=int, default=2, help="generations running at once (default: 2)")
+    parser.add_argument("--limit", type=int, default=0, help="generate at most this many hints (default: all)")
+    parser.add_argument("--source", default=None, help="only questions from this source")
+    args = parser.parse_args()
+
+    problems = questions_by_attempts(args.source)
+    pending, cached, skipped = pending_problems(problems, args.model, args.limit)
+    print(f"{len(problems)} questions, {cached} hints already cached, {len(pending)} to generate with {args.model}")
+    if skipped:
+        limit = hint_cache.cache.limit_for(args.model)
+        print(f"Warning: the cache keeps {limit} hints for {args.model}; skipping the {skipped} least attempted questions")
+    if not pending:
+        return
+
+    started = time.perf_counter()
+    try:
+        generated, failed = asyncio.run(pregenerate(pending, args.model, args.concurrency))
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume")
+        return
+    print(f"Generated {generated} hints ({failed} failed) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+In-memory index of question IDs used to pick session questions without
+loading every matching row.
+
+Questions are grouped into buckets keyed by (source, difficulty, is_active).
+Sampling k questions only touches k IDs; the caller then fetches just those
+rows from the database.
+
+Each topic also keeps the set of its question IDs, so a multi-topic session
+takes the union of a few precomputed sets and keeps the IDs whose bucket
+matches the other filters, without querying the database.
+
+Near-duplicate questions (see near_duplicates.py) share a cluster ID, and a
+sample never contains two questions from the same cluster.
+"""
+import asyncio
+import bisect
+import random
+import threading
+import time
+
+from sqlalchemy import func, literal_column
+
+import models
+import topic_taxonomy
+
+# How often (seconds) to check the table for rows written by other processes,
+# e.g. import_datasets.py running while the API is up.
+REFRESH_INTERVAL = 5.0
+# Full rebuild as a safety net for in-place edits made by other workers.
+REBUILD_INTERVAL = 300.0
+
+
+class _Bucket:
+    """
+    A set of question IDs with O(1) add/remove and O(k) random sampling.
+    """
+    __slots__ = ("ids", "pos")
+
+    def __init__(self):
+        self.ids = []
+        self.pos = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, question_id):
+        return question_id in self.pos
+
+    def add(self, question_id):
+        if question_id in self.pos:
+            return
+        self.pos[question_id] = len(self.ids)
+        self.ids.append(question_id)
+
+    def remove(self, question_id):
+        i = self.pos.pop(question_id, None)
+        if i is None:
+            return
+        last = self.ids.pop()
+        if i < len(self.ids):
+            # Swap the last ID into the hole to keep the list dense
+            self.ids[i] = last
+            self.pos[last] = i
+
+
+class QuestionIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Held for a whole sync, which queries the database without holding
+        # _lock. Not reentrant, unlike _lock.
+        self._syncing = threading.Lock()
+        self._async_syncing = None  # (event loop, asyncio.Lock), see refresh()
+        self._buckets = {}  # (source, difficulty, is_active) -> _Bucket
+        self._keys = {}  # question_id -> bucket key
+        self._topics = {}  # topic_id -> set of question IDs
+        self._topic_ids = {}  # slug -> topic_id
+        self._topic_names = {}  # topic_id -> (slug, name)
+        self._clusters = {}  # question_id -> cluster_id, only for questions with near-duplicates
+        self._loaded = False
+        self._max_id = 0
+        self._edits = 0  # put/discard/reload_topics calls, to spot edits made during a sync
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._built_at = 0.0
+
+    def __len__(self):
+        return len(self._keys)
+
+    # --- Maintenance ---
+
+    def put(self, question_id, source, difficulty, is_active):
+        """
+        Add a question or move it to the bucket matching its new attributes.
+        """
+        with self._lock:
+            self._edits += 1
+            self._put(question_id, source, difficulty, is_active)
+
+    def _put(self, question_id, source, difficulty, is_active):
+        key = (source, difficulty, bool(is_active))
+        old_key = self._keys.get(question_id)
+        if old_key == key:
+            return
+        if old_key is not None:
+            self._buckets[old_key].remove(question_id)
+        self._buckets.setdefault(key, _Bucket()).add(question_id)
+        self._keys[question_id] = key
+        self._max_id = max(self._max_id, question_id)
+
+    def put_question(self, question):
+        self.put(question.id, question.source, question.difficulty, question.is_active)
+
+    def reload_topics(self, db, question_id):
+        """
+        Re-read the topics a question is filed under, e.g. after it was re-tagged.
+        """
+        links = db.query(models.QuestionTopic.topic_id, models.QuestionTopic.question_id).filter(
+            models.QuestionTopic.question_id == question_id
+        ).all()
+        topics = self._read_topics(db)
+        with self._lock:
+            self._edits += 1
+            for ids in self._topics.values():
+                ids.discard(question_id)
+            self._set_topics(topics, links)
+
+    def discard(self, question_id):
+        with self._lock:
+            self._edits += 1
+            key = self._keys.pop(question_id, None)
+            if key is not None:
+                self._buckets[key].remove(question_id)
+            for ids in self._topics.values():
+                ids.discard(question_id)
+            self._clusters.pop(question_id, None)
+
+    def invalidate(self):
+        """
+        Force a full rebuild on the next sync (e.g. after clearing the bank).
+        """
+        with self._lock:
+            self._loaded = False
+
+    def rebuild(self, db):
+        rows = db.query(
+            models.Question.id,
+            models.Question.source,
+            models.Question.difficulty,
+            models.Question.is_active,
+        ).all()
+        links = db.query(models.QuestionTopic.topic_id, models.QuestionTopic.question_id).all()
+        clusters = self._read_clusters(db)
+        topics = self._read_topics(db)
+
+        buckets = {}
+        keys = {}
+        for question_id, source, difficulty, is_active in rows:
+            key = (source, difficulty, bool(is_active))
+            buckets.setdefault(key, _Bucket()).add(question_id)
+            keys[question_id] = key
+        with self._lock:
+            self._buckets = buckets
+            self._keys = keys
+            self._topics = {}
+            self._max_id = max(keys, default=0)
+            self._set_topics(topics, links)
+            self._clusters = dict(clusters)
+            self._loaded = True
+            self._built_at = time.monotonic()
+
+    @staticmethod
+    def _read_clusters(db):
+        return db.query(models.Question.id, models.Question.cluster_id).filter(
+            models.Question.cluster_id != models.Question.id
+        ).all()
+
+    @staticmethod
+    def _read_topics(db):
+        return db.query(models.Topic.id, models.Topic.slug, models.Topic.name).all()
+
+    def _set_topics(self, topics, links):
+        self._topic_ids = {slug: topic_id for topic_id, slug, _ in topics}
+        self._topic_names = {topic_id: (slug, name) for topic_id, slug, name in topics}
+        for topic_id, question_id in links:
+            self._topics.setdefault(topic_id, set()).add(question_id)
+
+    def _load_new_rows(self, db, after_id):
+        rows = db.query(
+            models.Question.id,
+            models.Question.source,
+            models.Question.difficulty,
+            models.Question.is_active,
+        ).filter(models.Question.id > after_id).all()
+        links = db.query(models.QuestionTopic.topic_id, models.QuestionTopic.question_id).filter(
+            models.QuestionTopic.question_id > after_id
+        ).all()
+        # All of them: new rows can merge clusters and relabel older rows
+        clusters = self._read_clusters(db)
+        topics = self._read_topics(db)
+        with self._lock:
+            for row in rows:
+                self._put(*row)
+            self._set_topics(topics, links)
+            self._clusters = dict(clusters)
+
+    def _due(self, force=False):
+        return not self._loaded or force or time.monotonic() - self._checked_at >= REFRESH_INTERVAL
+
+    def sync(self, db, force=False):
+        """
+        Bring the index up to date with the questions table.
+
+        New rows are loaded incrementally; anything that cannot be explained by
+        appended rows (deletes, re-imports) triggers a full rebuild.
+
+        One caller syncs at a time. Until the index is first loaded the others
+        wait for it; after that they use the index as it is.
+        """
+        if not self._due(force):
+            return
+        if not self._syncing.acquire(blocking=not self._loaded):
+            return
+        try:
+            if not self._due(force):
+                return  # Synced while we waited
+            self._checked_at = time.monotonic()
+            edits = self._edits
+            self._sync(db)
+            with self._lock:
+                if self._edits != edits:
+                    # A put() or discard() raced with the queries and may
+                    # have been overwritten with older rows: rebuild on the
+                    # next sync
+                    self._checked_at = self._built_at = 0.0
+        finally:
+            self._syncing.release()
+
+    def _sync(self, db):
+        if not self._loaded or time.monotonic() - self._built_at > REBUILD_INTERVAL:
+            self.rebuild(db)
+            self._fingerprint = self._read_fingerprint(db, self._max_id)
+            return
+
+        fingerprint = self._read_fingerprint(db, self._max_id)
+        if fingerprint == self._fingerprint:
+            return
+
+        previous, self._fingerprint = self._fingerprint, fingerprint
+        rows, clusters, topics = fingerprint
+        if topics != previous[2]:
+            # Loaded questions were re-tagged, e.g. by topic_taxonomy.py or
+            # a re-import
+            self._reload_topics(db)
+        if rows == previous[0]:
+            if clusters != previous[1]:
+                # Only cluster labels changed, e.g. near_duplicates.py rebuild
+                cluster_rows = self._read_clusters(db)
+                with self._lock:
+                    self._clusters = dict(cluster_rows)
+            return
+        max_id, count, _ = rows
+        if max_id is not None and max_id > self._max_id:
+            self._load_new_rows(db, self._max_id)
+            if count == len(self._keys):
+                # Watch the new questions' links from now on
+                self._fingerprint = (rows, clusters, self._read_topic_fingerprint(db, self._max_id))
+                return
+        self.rebuild(db)
+        self._fingerprint = (rows, clusters, self._read_topic_fingerprint(db, self._max_id))
+
+    def _reload_topics(self, db):
+        links = db.query(models.QuestionTopic.topic_id, models.QuestionTopic.question_id).all()
+        topics = self._read_topics(db)
+        with self._lock:
+            self._topics = {}
+            self._set_topics(topics, links)
+
+    async def refresh(self, db):
+        """
+        sync() for an AsyncSession. run_sync() runs every request's sync on
+        the event loop thread, where a thread lock cannot keep them apart,
+        so requests take turns on an asyncio lock instead.
+        """
+        if not self._due():
+            return
+        loop = asyncio.get_running_loop()
+        if self._async_syncing is None or self._async_syncing[0] is not loop:
+            self._async_syncing = (loop, asyncio.Lock())
+        lock = self._async_syncing[1]
+        if self._loaded and lock.locked():
+            return
+        async with lock:
+            await db.run_sync(self.sync)
+
+    @classmethod
+    def _read_fingerprint(cls, db, max_id):
+        """
+        ((max ID, count, latest created_at), sum of cluster IDs, topic links
+        fingerprint) of the questions table.
+        """
+        # Merging two clusters relabels the higher one's members with the
+        # lower label, which always lowers the sum of cluster IDs
+        max_id_now, count, created_at, clusters = db.query(
+            func.max(models.Question.id),
+            func.count(models.Question.id),
+            func.max(models.Question.created_at),
+            func.sum(models.Question.cluster_id),
+        ).one()
+        return (max_id_now, count, created_at), clusters, cls._read_topic_fingerprint(db, max_id)
+
+    @staticmethod
+    def _read_topic_fingerprint(db, max_id):
+        """
+        A checksum of the topic links of questions up to max_id. Links of
+        newer questions are left out, so appending questions does not look
+        like a re-tag; reloading every link is far slower than the check.
+        """
+        QT = models.QuestionTopic
+        return (max_id,) + tuple(db.query(
+            func.count(),
+            func.max(literal_column("question_topics.rowid")),
+            func.sum(QT.topic_id),
+            func.sum(QT.question_id * QT.topic_id),
+        ).filter(QT.question_id <= max_id).one())
+
+    # --- Lookup ---
+
+    def _matching_buckets(self, source=None, difficulty_min=None, difficulty_max=None, is_active=True):
+        return [self._buckets[key] for key in self._matching_keys(source, difficulty_min, difficulty_max, is_active)]
+
+    def _matching_keys(self, source=None, difficulty_min=None, difficulty_max=None, is_active=True):
+        keys = []
+        for key, bucket in self._buckets.items():
+            b_source, b_difficulty, b_active = key
+            if b_active != is_active or not bucket:
+                continue
+            if source and b_source != source:
+                continue
+            if difficulty_min or difficulty_max:
+                if b_difficulty is None:
+                    continue
+                if difficulty_min and b_difficulty < difficulty_min:
+                    continue
+                if difficulty_max and b_difficulty > difficulty_max:
+                    continue
+            keys.append(key)
+        return keys
+
+    def _id_lists(self, topics=None, **filters):
+        """
+        Lists of IDs matching the filters: the bucket ID lists themselves, or
+        with topics, one list of the IDs filed under any of them.
+        """
+        if not topics:
+            return [bucket.ids for bucket in self._matching_buckets(**filters)]
+        topic_ids = {self._topic_ids.get(slug) for slug, _ in topic_taxonomy.parse_topics(topics)}
+        tagged = set().union(*(self._topics.get(topic_id, ()) for topic_id in topic_ids))
+        keys = set(self._matching_keys(**filters))
+        bucket_of = self._keys.get
+        return [[question_id for question_id in tagged if bucket_of(question_id) in keys]]
+
+    def candidate_ids(self, **filters):
+        """
+        All IDs matching the filters. O(matches), but in memory only.
+        """
+        with self._lock:
+            ids = []
+            for id_list in self._id_lists(**filters):
+                ids.extend(id_list)
+            return ids
+
+    def count(self, **filters):
+        with self._lock:
+            return sum(len(ids) for ids in self._id_lists(**filters))
+
+    def topic_counts(self):
+        """
+        [(slug, name, active questions)] for every topic with any, largest first.
+        """
+        with self._lock:
+            counts = []
+            for topic_id, ids in self._topics.items():
+                active = sum(1 for question_id in ids if self._keys.get(question_id, (None, None, False))[2])
+                if active:
+                    slug, name = self._topic_names.get(topic_id, (None, None))
+                    counts.append((slug, name, active))
+            return sorted(counts, key=lambda c: (-c[2], c[0]))
+
+    def sample(self, k, exclude=None, **filters):
+        """
+        Pick up to k distinct IDs uniformly at random from the matching buckets,
+        at most one per near-duplicate cluster. Runs in O(k + number of
+        buckets), independent of the bank size; with topics, in O(questions
+        filed under them).
+
+        IDs in exclude (anything supporting `in`, e.g. an AttemptedSet) are
+        only used to top up the result when there are fewer than k others.
+        Near-duplicates are never used to top up, so a pool with fewer than k
+        clusters gives a shorter sample.
+        """
+        with self._lock:
+            buckets = self._id_lists(**filters)
+            offsets = []
+            total = 0
+            for bucket in buckets:
+                offsets.append(total)
+                total += len(bucket)
+            if total == 0 or k <= 0:
+                return []
+
+            def at(p):
+                b = bisect.bisect_right(offsets, p) - 1
+                return buckets[b][p - offsets[b]]
+
+            cluster_of = self._clusters.get
+            exclude = exclude or ()
+
+            # Rejection sampling: cheap as long as most candidates are neither
+            # excluded nor near-duplicates of a pick. Give up after a bounded
+            # number of draws.
+            max_draws = 4 * k + 32
+            if total > max_draws:
+                picked = []
+                clusters = set()
+                seen = set()
+                while len(seen) < max_draws:
+                    p = random.randrange(total)
+                    if p in seen:
+                        continue
+                    seen.add(p)
+                    question_id = at(p)
+                    cluster = cluster_of(question_id, question_id)
+                    if question_id not in exclude and cluster not in clusters:
+                        picked.append(question_id)
+                        clusters.add(cluster)
+                        if len(picked) == k:
+                            return picked
+
+            # Mostly excluded (or a small pool): one pass over the IDs in
+            # memory, fresh ones first
+            fresh = []
+            stale = []
+            for bucket in buckets:
+                for question_id in bucket:
+                    (stale if question_id in exclude else fresh).append(question_id)
+            random.shuffle(fresh)
+            random.shuffle(stale)
+            ids = []
+            clusters = set()
+            for question_id in fresh + stale:
+                cluster = cluster_of(question_id, question_id)
+                if cluster not in clusters:
+                    ids.append(question_id)
+                    clusters.add(cluster)
+                    if len(ids) == k:
+                        break
+            random.shuffle(ids)
+            return ids
+
+
+index = QuestionIndex()
+
+
+def fetch_questions(db, ids):
+    """
+    Load the given question rows, preserving the order of ids.
+    """
+    if not ids:
+        return []
+    rows = db.query(models.Question).filter(models.Question.id.in_(ids)).all()
+    by_id = {q.id: q for q in rows}
+    return [by_id[i] for i in ids if i in by_id]
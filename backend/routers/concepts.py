@@ -0,0 +1,72 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_read_db
+import models
+import schemas
+import curriculum_store
+
+router = APIRouter()
+
+# The curriculum only changes when aggregate.py is rerun
+CACHE_CONTROL = "public, max-age=60"
+
+async def query_store(method, *args):
+    try:
+        return await asyncio.to_thread(method, *args)
+    except curriculum_store.CurriculumUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/concepts", response_model=schemas.ConceptPage)
+async def list_concepts(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    Concepts with their sub-problem counts, largest first.
+    """
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return await query_store(curriculum_store.store.concepts, skip, limit)
+
+@router.get("/concepts/{concept_id}", response_model=schemas.SubProblemPage)
+async def list_concept_sub_problems(
+    concept_id: int,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    A page of the sub-problems that build up a concept.
+    """
+    page = await query_store(curriculum_store.store.sub_problems, concept_id, skip, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Concept not found")
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return page
+
+@router.get("/concepts/questions/{question_id}/ladder", response_model=schemas.ConceptLadder, response_model_exclude_none=True)
+async def get_question_ladder(
+    question_id: int,
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    The sub-problems generated for a question, in the order they build up
+    to it, matched on the question's text.
+    """
+    row = (await db.execute(select(models.Question.problem).where(models.Question.id == question_id))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    ladder = await query_store(curriculum_store.store.ladder, row.problem) if row.problem else None
+    if ladder is None:
+        raise HTTPException(status_code=404, detail="No curriculum for this question")
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return {"question_id": question_id, **ladder}
+
+@router.get("/metrics/concepts")
+async def get_concept_metrics():
+    return curriculum_store.store.metrics()
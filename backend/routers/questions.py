@@ -1,115 +1,150 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-import random
 
-from database import get_db
+from database import get_async_db, get_async_read_db
 import models
 import schemas
+import question_index
+import attempt_cache
+import search_index
+import topic_taxonomy
 
 router = APIRouter()
 
-@router.get("/questions", response_model=List[schemas.Question])
-def list_questions(
+# Columns that can be requested via ?fields= on GET /questions
+QUESTION_FIELDS = [
+    "id", "source", "external_id", "problem", "image_path", "image_width", "image_height",
+    "solution", "answer", "topic", "difficulty", "options", "correct_option_label", "is_active", "cluster_id",
+]
+# Heavy columns only loaded when explicitly requested
+DEFERRED_FIELDS = {"solution"}
+
+@router.get(
+    "/questions",
+    response_model=List[schemas.QuestionPartial],
+    response_model_exclude_unset=True,
+)
+async def list_questions(
+    response: Response,
     skip: int = 0, 
-    limit: int = 100, 
+    limit: int = Query(100, ge=1, le=5000), 
     active_only: bool = False,
-    db: Session = Depends(get_db)
+    after_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    query = db.query(models.Question)
+    """
+    Page through questions ordered by id.
+
+    Pass the X-Next-Cursor header of a response as after_id to get the next
+    page (keyset pagination; skip is kept for older clients). fields is a
+    comma-separated list of columns; by default everything except the heavy
+    solution column is returned.
+    """
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in QUESTION_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        if "id" not in selected:
+            selected.insert(0, "id")
+    else:
+        selected = [f for f in QUESTION_FIELDS if f not in DEFERRED_FIELDS]
+
+    query = select(*[getattr(models.Question, f) for f in selected])
     if active_only:
-        query = query.filter(models.Question.is_active == True)
+        query = query.where(models.Question.is_active == True)
     
-    return query.offset(skip).limit(limit).all()
+    if after_id is not None:
+        query = query.where(models.Question.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+
+    rows = (await db.execute(query.order_by(models.Question.id).limit(limit))).all()
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return [dict(row._mapping) for row in rows]
+
+@router.get("/questions/{question_id}/raw", response_model=schemas.QuestionRecord)
+async def get_question_raw(question_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    """
+    The original dataset record a question was imported from.
+    """
+    record = await db.get(models.QuestionRecord, question_id)
+    if not record:
+        exists = await db.scalar(select(models.Question.id).where(models.Question.id == question_id))
+        if not exists:
+            raise HTTPException(status_code=404, detail="Question not found")
+        return {"question_id": question_id, "meta_data": None}
+    return {"question_id": question_id, "meta_data": record.data}
 
 @router.patch("/questions/{question_id}", response_model=schemas.Question)
-def update_question(
+async def update_question(
     question_id: int, 
     question_update: schemas.QuestionUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_question = db.query(models.Question).filter(models.Question.id == question_id).first()
+    db_question = await db.get(models.Question, question_id)
     if not db_question:
         raise HTTPException(status_code=404, detail="Question not found")
     
     update_data = question_update.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_question, key, value)
-    
-    db.commit()
-    db.refresh(db_question)
+
+    await db.flush()
+    await db.run_sync(search_index.index_questions, [question_id])
+    if "topic" in update_data:
+        await db.run_sync(lambda s: topic_taxonomy.set_topics(s, {question_id: update_data["topic"]}))
+    await db.commit()
+    await db.refresh(db_question)
+    question_index.index.put_question(db_question)
+    if "topic" in update_data:
+        await db.run_sync(question_index.index.reload_topics, question_id)
     return db_question
 
 @router.post("/sessions", response_model=List[schemas.Question])
-def create_session(
+async def create_session(
     session_config: schemas.SessionCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    query = db.query(models.Question).filter(models.Question.is_active == True)
-    
-    if session_config.topics:
-        # Simple filter - in real app might need more complex topic matching
-        # For now, let's assume exact match or just ignore if empty
-        pass 
-    
-    if session_config.source:
-        query = query.filter(models.Question.source == session_config.source)
-        
-    if session_config.difficulty_min:
-        query = query.filter(models.Question.difficulty >= session_config.difficulty_min)
-    if session_config.difficulty_max:
-        query = query.filter(models.Question.difficulty <= session_config.difficulty_max)
+    index = question_index.index
+    await index.refresh(db)
+    # Questions filed under any of the topics; unknown topics match nothing
+    filters = dict(
+        source=session_config.source,
+        difficulty_min=session_config.difficulty_min,
+        difficulty_max=session_config.difficulty_max,
+        topics=session_config.topics,
+    )
 
-    # Get all matching questions
-    all_questions = query.all()
-
-    # Filter by user attempts if user_id is provided
+    # Prefer questions the user has not attempted yet
+    attempted = None
     if session_config.user_id:
-        attempted_ids = db.query(models.Attempt.question_id).filter(models.Attempt.user_id == session_config.user_id).all()
-        attempted_ids = {id[0] for id in attempted_ids}
-        
-        unattempted_questions = [q for q in all_questions if q.id not in attempted_ids]
-        
-        if len(unattempted_questions) >= session_config.limit:
-            questions = random.sample(unattempted_questions, session_config.limit)
-        else:
-            # Not enough unattempted, take all unattempted and fill with attempted
-            needed = session_config.limit - len(unattempted_questions)
-            attempted_questions = [q for q in all_questions if q.id in attempted_ids]
-            
-            # If we still don't have enough total (unattempted + attempted), just take everything
-            if len(attempted_questions) < needed:
-                 questions = unattempted_questions + attempted_questions
-            else:
-                 questions = unattempted_questions + random.sample(attempted_questions, needed)
-            
-            random.shuffle(questions)
-    else:
-        # No user, just random sample
-        if len(all_questions) > session_config.limit:
-            questions = random.sample(all_questions, session_config.limit)
-        else:
-            questions = all_questions
-            random.shuffle(questions)
+        attempted = await db.run_sync(attempt_cache.cache.get, session_config.user_id)
+
+    ids = index.sample(session_config.limit, exclude=attempted, **filters)
         
-    return questions
+    return await db.run_sync(question_index.fetch_questions, ids)
+
+@router.get("/topics", response_model=List[schemas.TopicSummary])
+async def list_topics(db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Topics that can be passed to POST /sessions, with their active question counts.
+    """
+    index = question_index.index
+    await index.refresh(db)
+    return [{"slug": slug, "name": name, "questions": count} for slug, name, count in index.topic_counts()]
 
 @router.get("/questions/olympiad", response_model=List[schemas.Question])
-def get_olympiad_questions(
+async def get_olympiad_questions(
     limit: int = 20,
     source: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    query = db.query(models.Question).filter(models.Question.is_active == True)
-    
-    if source:
-        query = query.filter(models.Question.source == source)
-        
-    questions = query.all()
-        
-    if len(questions) > limit:
-        questions = random.sample(questions, limit)
-    else:
-        random.shuffle(questions)
-        
-    return questions
+    index = question_index.index
+    await index.refresh(db)
+    ids = index.sample(limit, source=source)
+    return await db.run_sync(question_index.fetch_questions, ids)
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from database import get_async_read_db
+import schemas
+import search_index
+
+router = APIRouter()
+
+@router.get("/search", response_model=List[schemas.SearchResult], response_model_exclude_none=True)
+async def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    kind: Optional[str] = None,
+    skip: int = Query(0, ge=0, le=1000),
+    limit: int = Query(20, ge=1, le=100),
+    prefix: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Ranked full-text search over active questions and curriculum
+    sub-problems. kind restricts results to "question" or "sub_problem";
+    prefix=true matches the last word as a prefix, for search as you type.
+    Snippets mark matches with <mark></mark>.
+    """
+    if kind not in (None, "question", "sub_problem"):
+        raise HTTPException(status_code=400, detail="kind must be question or sub_problem")
+    return await db.run_sync(search_index.search, q, kind, limit, skip, prefix)
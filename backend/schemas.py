@@ -8,6 +8,8 @@ class QuestionBase(BaseModel):
     external_id: str
     problem: Optional[str] = None
     image_path: Optional[str] = None
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
     solution: Optional[str] = None
     answer: Optional[str] = None
     topic: Optional[str] = None
@@ -29,8 +31,32 @@ class QuestionUpdate(BaseModel):
 
 class Question(QuestionBase):
     id: int
+    cluster_id: Optional[int] = None # Shared by near-duplicates of the same problem
+
+class QuestionRecord(BaseModel):
+    question_id: int
     meta_data: Optional[dict] = None
 
+class QuestionPartial(BaseModel):
+    """
+    A question projected down to the columns requested via ?fields=.
+    """
+    id: int
+    source: Optional[str] = None
+    external_id: Optional[str] = None
+    problem: Optional[str] = None
+    image_path: Optional[str] = None
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    solution: Optional[str] = None
+    answer: Optional[str] = None
+    topic: Optional[str] = None
+    difficulty: Optional[int] = None
+    options: Optional[List[str]] = None
+    correct_option_label: Optional[str] = None
+    is_active: Optional[bool] = None
+    cluster_id: Optional[int] = None
+
 class SessionCreate(BaseModel):
     limit: int = 10
     difficulty_min: Optional[int] = None
@@ -40,6 +66,11 @@ class SessionCreate(BaseModel):
     mode: Optional[str] = "practice" # "practice" or "challenge"
     source: Optional[str] = None
 
+class TopicSummary(BaseModel):
+    slug: str
+    name: str
+    questions: int # active questions filed under the topic
+
 class HintRequest(BaseModel):
     question_text: str
     model: Optional[str] = "gemma3:latest"
@@ -67,6 +98,9 @@ class AttemptBase(BaseModel):
 class AttemptCreate(AttemptBase):
     user_id: int
 
+class AttemptBulkCreate(BaseModel):
+    attempts: List[AttemptCreate]
+
 class Attempt(AttemptBase):
     id: int
     user_id: int
@@ -77,3 +111,86 @@ class Attempt(AttemptBase):
     class Config:
         orm_mode = True
 
+
+class QuestionSummary(BaseModel):
+    id: int
+    source: str
+    problem: Optional[str] = None
+    difficulty: Optional[int] = None
+    correct_option_label: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+class AttemptHistory(AttemptBase):
+    id: int
+    user_id: int
+    timestamp: datetime
+    question: Optional[QuestionSummary] = None
+
+    class Config:
+        orm_mode = True
+
+class StatsGroup(BaseModel):
+    source: Optional[str] = None
+    difficulty: Optional[int] = None
+    attempts: int
+    correct: int
+    accuracy: float
+
+class UserStats(BaseModel):
+    user_id: int
+    total_attempts: int
+    correct: int
+    accuracy: float
+    time_taken: int
+    by_source: List[StatsGroup]
+    by_source_difficulty: List[StatsGroup]
+
+class ConceptRef(BaseModel):
+    id: int
+    name: str
+
+class ConceptSummary(ConceptRef):
+    sub_problems: int
+    problems: int
+
+class ConceptPage(BaseModel):
+    total: int
+    skip: int
+    limit: int
+    items: List[ConceptSummary]
+
+class SubProblem(BaseModel):
+    id: int
+    position: int
+    question: Optional[str] = None
+    answer: Optional[str] = None
+    concept: Optional[str] = None
+    parent_problem_id: Optional[int] = None
+    key_insight: Optional[str] = None
+
+class SubProblemPage(BaseModel):
+    concept: ConceptRef
+    total: int
+    skip: int
+    limit: int
+    items: List[SubProblem]
+
+class ConceptLadder(BaseModel):
+    question_id: int
+    key_insight: Optional[str] = None
+    concepts: List[ConceptRef]
+    steps: List[SubProblem]
+
+class SearchResult(BaseModel):
+    kind: str # "question" or "sub_problem"
+    id: int
+    score: float # bm25, lower is a better match
+    snippet: str
+    source: Optional[str] = None
+    difficulty: Optional[int] = None
+    topic: Optional[str] = None
+    question: Optional[str] = None
+    answer: Optional[str] = None
+    concepts: Optional[str] = None
@@ -0,0 +1,201 @@
+"""
+Local dataset snapshots for offline imports.
+
+A snapshot is one Arrow IPC file per (dataset, config, split). Each row holds
+the original record as JSON and any PIL images it contained as PNG bytes.
+The file is read through a memory map, one record batch at a time, and the
+IPC footer indexes the batches so a reader can start at any stream position
+without decoding what comes before it.
+
+    python snapshots.py create                   # every dataset the importers use
+    python snapshots.py create --limit 50 --dir fixtures
+    python snapshots.py list
+
+load_dataset() is a drop-in for datasets.load_dataset(..., streaming=True).
+It reads the snapshot when one exists and otherwise goes to the Hub. Set
+MATH_SNAPSHOT_ONLY=1 on hosts without network access so a missing snapshot
+is an error rather than a download attempt. MATH_SNAPSHOT_DIR moves the
+snapshot directory, e.g. to a set of small fixture snapshots.
+"""
+import argparse
+import io
+import json
+import os
+import time
+
+import pyarrow as pa
+
+SNAPSHOT_DIR = os.environ.get(
+    "MATH_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "snapshots"),
+)
+SNAPSHOT_ONLY = os.environ.get("MATH_SNAPSHOT_ONLY", "0") == "1"
+BATCH_ROWS = 1000
+
+# (path, config, split) for every dataset the importers and the curriculum
+# generator read
+DATASETS = [
+    ("RUC-AIBOX/OlymMATH", "en-easy", "test"),
+    ("AI-MO/NuminaMath-CoT", None, "train"),
+    ("math-ai/olympiadbench", None, "test"),
+    ("MathArena/kangaroo_2025_5-6_outputs", None, "train"),
+    ("xlangai/BRIGHT", "examples", "leetcode"),
+    ("xlangai/BRIGHT", "examples", "economics"),
+]
+
+SCHEMA = pa.schema([
+    ("record", pa.large_string()),
+    ("images", pa.list_(pa.struct([("field", pa.string()), ("png", pa.large_binary())]))),
+])
+
+
+def snapshot_path(path, name=None, split=None, directory=None):
+    filename = "__".join([path.replace("/", "__"), name or "default", split or "all"]) + ".arrow"
+    return os.path.join(directory or SNAPSHOT_DIR, filename)
+
+
+class Snapshot:
+    """
+    Iterable over a snapshot file, yielding records as the Hub's streaming
+    datasets do. Images come back as PIL images.
+    """
+
+    def __init__(self, filename, start=0):
+        self.filename = filename
+        self.start = start
+
+    def _open(self):
+        return pa.ipc.open_file(pa.memory_map(self.filename, "r"))
+
+    @property
+    def info(self):
+        metadata = self._open().schema.metadata or {}
+        return {k.decode(): v.decode() for k, v in metadata.items()}
+
+    def __len__(self):
+        reader = self._open()
+        rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        return max(rows - self.start, 0)
+
+    def skip(self, n):
+        return Snapshot(self.filename, self.start + n)
+
+    def __iter__(self):
+        reader = self._open()
+        position = 0
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if position + batch.num_rows <= self.start:
+                position += batch.num_rows
+                continue
+            records = batch.column("record")
+            images = batch.column("images")
+            for j in range(max(self.start - position, 0), batch.num_rows):
+                yield decode(records[j].as_py(), images[j].as_py())
+            position += batch.num_rows
+
+
+def encode(item):
+    """
+    Split a dataset record into its JSON text and a list of PNG-encoded
+    images.
+    """
+    images = []
+    record = {}
+    for field, value in item.items():
+        if hasattr(value, "save") and hasattr(value, "mode"): # PIL image
+            buffer = io.BytesIO()
+            value.save(buffer, format="PNG")
+            images.append({"field": field, "png": buffer.getvalue()})
+        else:
+            record[field] = value
+    return json.dumps(record, default=str), images
+
+
+def decode(record, images):
+    item = json.loads(record)
+    if images:
+        from PIL import Image
+        for image in images:
+            item[image["field"]] = Image.open(io.BytesIO(image["png"]))
+    return item
+
+
+def create_snapshot(path, name=None, split=None, limit=None, directory=None):
+    """
+    Stream a dataset from the Hub into a snapshot file. Written to a temporary
+    file first so an interrupted download never leaves a partial snapshot.
+    """
+    from datasets import load_dataset as hub_load_dataset
+
+    filename = snapshot_path(path, name, split, directory)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    dataset = hub_load_dataset(path, name, split=split, streaming=True)
+
+    schema = SCHEMA.with_metadata({
+        "path": path,
+        "config": name or "",
+        "split": split or "",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    })
+    rows = 0
+    tmp = filename + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        records, images = [], []
+        for item in dataset:
+            if limit and rows >= limit:
+                break
+            record, item_images = encode(item)
+            records.append(record)
+            images.append(item_images)
+            rows += 1
+            if len(records) >= BATCH_ROWS:
+                writer.write_batch(pa.record_batch([records, images], schema=schema))
+                records, images = [], []
+        if records:
+            writer.write_batch(pa.record_batch([records, images], schema=schema))
+    os.replace(tmp, filename)
+    return filename, rows
+
+
+def load_dataset(path, name=None, split=None, streaming=True, **kwargs):
+    filename = snapshot_path(path, name, split)
+    if os.path.exists(filename):
+        return Snapshot(filename)
+    if SNAPSHOT_ONLY:
+        raise FileNotFoundError(f"No snapshot for {path} ({name or 'default'}/{split}) at {filename}")
+    from datasets import load_dataset as hub_load_dataset
+    return hub_load_dataset(path, name, split=split, streaming=streaming, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="download snapshots from the Hub")
+    create.add_argument("--limit", type=int, default=0, help="rows per dataset, 0 for all")
+    create.add_argument("--dir", default=None, help=f"output directory (default: {SNAPSHOT_DIR})")
+    create.add_argument("--datasets", nargs="+", metavar="PATH", help="only these dataset paths")
+    commands.add_parser("list", help="show the snapshots that exist")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        for path, name, split in DATASETS:
+            if args.datasets and path not in args.datasets:
+                continue
+            start = time.perf_counter()
+            filename, rows = create_snapshot(path, name, split, limit=args.limit, directory=args.dir)
+            print(f"{path} ({name or 'default'}/{split}): {rows} rows in {time.perf_counter() - start:.1f}s -> {filename}")
+        return
+
+    for path, name, split in DATASETS:
+        filename = snapshot_path(path, name, split)
+        if os.path.exists(filename):
+            snapshot = Snapshot(filename)
+            size_mb = os.path.getsize(filename) / 1e6
+            print(f"{path} ({name or 'default'}/{split}): {len(snapshot)} rows, {size_mb:.1f} MB, created {snapshot.info.get('created_at')}")
+        else:
+            print(f"{path} ({name or 'default'}/{split}): missing")
+
+
+if __name__ == "__main__":
+    main()
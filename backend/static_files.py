@@ -0,0 +1,138 @@
+"""
+Static file serving with HTTP caching.
+
+Files whose names carry a content fingerprint (a run of 16+ hex digits, as
+written by image_pipeline.py and the avatar upload) never change, so they are
+served with Cache-Control: immutable and a year's max-age. Everything else
+must be revalidated, which is cheap because every response has a strong
+ETag over the file contents and conditional requests get a 304.
+
+If a client accepts it and a precompressed sibling exists (file.br or
+file.gz), that is served instead with Content-Encoding set. Create the
+siblings at deploy time:
+
+    python static_files.py static
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import re
+from mimetypes import guess_type
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError: # Optional; gzip is always available
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+FINGERPRINT = re.compile(r"(?:^|[._-])([0-9a-f]{16,})(?:[._-]|$)")
+# Formats that are already compressed gain nothing from gzip or brotli
+COMPRESSIBLE = {".json", ".svg", ".css", ".js", ".html", ".txt", ".xml", ".csv"}
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+def fingerprint(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = FINGERPRINT.search(stem)
+    return match.group(1) if match else None
+
+
+class CachedStaticFiles(StaticFiles):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._etags = {} # path -> (mtime_ns, size, etag)
+
+    def etag(self, full_path, stat_result):
+        """
+        Strong ETag over the file contents. Fingerprinted files use the
+        fingerprint; others are hashed once per (mtime, size).
+        """
+        name_hash = fingerprint(full_path)
+        if name_hash:
+            return f'"{name_hash}"'
+        cached = self._etags.get(full_path)
+        if cached and cached[:2] == (stat_result.st_mtime_ns, stat_result.st_size):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(full_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()[:32]}"'
+        self._etags[full_path] = (stat_result.st_mtime_ns, stat_result.st_size, etag)
+        return etag
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        etag = self.etag(full_path, stat_result)
+        headers = {
+            "cache-control": IMMUTABLE if fingerprint(full_path) else REVALIDATE,
+        }
+        path, served_stat, media_type = full_path, stat_result, None
+
+        if os.path.splitext(full_path)[1].lower() in COMPRESSIBLE:
+            headers["vary"] = "Accept-Encoding"
+            accepted = {e.split(";")[0].strip() for e in request_headers.get("accept-encoding", "").split(",")}
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                try:
+                    variant_stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                # Skip variants left over from an older version of the file
+                if variant_stat.st_mtime < stat_result.st_mtime:
+                    continue
+                path, served_stat = full_path + suffix, variant_stat
+                media_type = guess_type(full_path)[0]
+                headers["content-encoding"] = encoding
+                # Each representation needs its own strong validator
+                etag = f'{etag[:-1]}-{encoding}"'
+                break
+
+        headers["etag"] = etag
+        response = FileResponse(
+            path, status_code=status_code, stat_result=served_stat, media_type=media_type, headers=headers
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def precompress(directory):
+    """
+    Write .gz (and .br, with the brotli package) next to every compressible
+    file that has no up-to-date variant yet.
+    """
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            variants = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append((".br", lambda d: brotli.compress(d, quality=11)))
+            for suffix, compress in variants:
+                target = path + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                with open(target, "wb") as f:
+                    f.write(compress(data))
+                written += 1
+    print(f"Wrote {written} precompressed files under {directory}" + ("" if brotli else " (gzip only, brotli not installed)"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", default="static")
+    precompress(parser.parse_args().directory)
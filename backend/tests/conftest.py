@@ -0,0 +1,13 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# The backend modules import each other as top-level modules (import models)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py builds its engines on import; keep them away from the real database
+_db_dir = tempfile.mkdtemp(prefix="math-tests-")
+atexit.register(shutil.rmtree, _db_dir, ignore_errors=True)
+os.environ.setdefault("MATH_DB_PATH", os.path.join(_db_dir, "app.db"))
@@ -0,0 +1,44 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The curriculum generator scripts import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "curriculum_generator"))
+
+import generate
+from checkpoint import JsonlCheckpoint
+
+RESULT = {"key_insight": "insight", "concepts": ["parity"], "sub_problems": []}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("data")
+    return tmp_path
+
+
+def test_legacy_results_are_seeded_under_the_old_model(data_dir):
+    with open(generate.LEGACY_OUTPUT_FILE, "w") as f:
+        json.dump([{"id": 1, "original_problem": "p", "original_solution": "s", **RESULT}], f)
+    cache = JsonlCheckpoint(generate.CACHE_FILE, key="key")
+    assert generate.seed_cache(cache) == 1
+
+    results = cache.load()
+    assert generate.result_key("p", "s", generate.MODEL) in results
+    # A run with another model generates its own results
+    assert generate.result_key("p", "s", "deepseek-r1") not in results
+    # Seeding only happens once
+    assert generate.seed_cache(cache) == 0
+
+
+def test_earlier_output_keeps_its_keys(data_dir):
+    key = generate.result_key("p", "s", "deepseek-r1")
+    JsonlCheckpoint(generate.OUTPUT_FILE).rewrite([
+        {"id": 1, "key": key, "original_problem": "p", "original_solution": "s", **RESULT},
+    ])
+    cache = JsonlCheckpoint(generate.CACHE_FILE, key="key")
+    assert generate.seed_cache(cache) == 1
+    assert cache.load()[key]["result"] == RESULT
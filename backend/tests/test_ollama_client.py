@@ -0,0 +1,115 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+import fake_ollama
+from ollama_client import OllamaBusy, OllamaClient, OllamaError
+
+
+@pytest.fixture(scope="module")
+def fake_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake_ollama.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        assert time.monotonic() < deadline, "fake Ollama did not start"
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(5)
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    monkeypatch.setattr(fake_ollama, "DELAY_MS", 10)
+    fake_ollama.stats.update(generations=0, active=0, max_active=0, disconnects=0, prompts={})
+    return fake_ollama.stats
+
+
+def run(fake_url, test, **kwargs):
+    async def main():
+        client = OllamaClient(base_url=fake_url, **kwargs)
+        try:
+            return await test(client)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+async def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_identical_requests_share_one_generation(fake_url, stats):
+    async def test(client):
+        return await asyncio.gather(*(client.generate("key", "m", "prompt") for _ in range(5))), client
+
+    texts, client = run(fake_url, test)
+    assert texts == [fake_ollama.HINT + " "] * 5
+    assert stats["generations"] == 1
+    assert client.upstream_calls == 1 and client.coalesced == 4
+
+
+def test_full_queue_raises_busy(fake_url, stats):
+    async def test(client):
+        first = client.stream("a", "m", "prompt")
+        second = client.stream("b", "m", "prompt")  # Queued behind the first
+        with pytest.raises(OllamaBusy):
+            client.stream("c", "m", "prompt")
+        assert client.rejected == 1
+        # A request joining a generation in flight does not need a slot
+        joined = client.stream("a", "m", "prompt")
+        return ["".join([chunk async for chunk in it]) for it in (first, second, joined)]
+
+    texts = run(fake_url, test, max_concurrency=1, max_queue=1)
+    assert texts == [fake_ollama.HINT + " "] * 3
+
+
+def test_last_subscriber_leaving_cancels_upstream(fake_url, stats):
+    async def test(client):
+        chunks = client.stream("key", "m", "prompt")
+        await chunks.__anext__()
+        await chunks.aclose()
+        await wait_for(lambda: stats["disconnects"] == 1)
+        return client
+
+    client = run(fake_url, test)
+    assert client.cancelled == 1
+    assert stats["generations"] == 1
+
+
+def test_late_joiner_survives_first_caller_leaving(fake_url, stats):
+    async def test(client):
+        first = client.stream("key", "m", "prompt")
+        second = client.stream("key", "m", "prompt")  # Not reading yet
+        await first.__anext__()
+        await first.aclose()
+        await asyncio.sleep(0.05)
+        return "".join([chunk async for chunk in second]), client
+
+    text, client = run(fake_url, test)
+    assert text == fake_ollama.HINT + " "
+    assert client.cancelled == 0 and stats["disconnects"] == 0
+
+
+def test_cancelled_generation_fails_remaining_readers(fake_url, stats):
+    async def test(client):
+        chunks = client.stream("key", "m", "prompt")
+        await chunks.__anext__()
+        await client.close()
+        with pytest.raises(OllamaError, match="cancelled"):
+            async for _ in chunks:
+                pass
+
+    run(fake_url, test)
@@ -0,0 +1,35 @@
+import pytest
+
+import hint_cache
+import llm_service
+import pregenerate_hints
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = hint_cache.HintCache(path=str(tmp_path / "hints.db"), max_per_model=3)
+    monkeypatch.setattr(hint_cache, "cache", cache)
+    return cache
+
+
+def store(cache, problem, model="m"):
+    cache.put(llm_service.hint_key(problem, model), model, llm_service.HINT_PROMPT_VERSION, ["hint"])
+
+
+def test_pending_fits_the_cache(cache):
+    problems = [f"problem {i}" for i in range(6)]  # Most attempted first
+    store(cache, "problem 1")
+    assert pregenerate_hints.pending_problems(problems, "m") == (["problem 0", "problem 2"], 1, 3)
+
+    # Storing them evicts nothing from this run
+    for problem in ["problem 0", "problem 2"]:
+        store(cache, problem)
+    assert cache.evictions == 0
+    assert pregenerate_hints.pending_problems(problems, "m") == ([], 3, 3)
+
+
+def test_pending_respects_limit(cache):
+    problems = [f"problem {i}" for i in range(6)]
+    assert pregenerate_hints.pending_problems(problems, "m", limit=2) == (["problem 0", "problem 1"], 0, 0)
+    assert pregenerate_hints.pending_problems(problems, "m", limit=5) == (["problem 0", "problem 1", "problem 2"], 0, 2)
+    assert pregenerate_hints.pending_problems(problems, "other", limit=1) == (["problem 0"], 0, 0)
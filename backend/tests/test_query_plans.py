@@ -0,0 +1,33 @@
+import pytest
+from sqlalchemy import create_engine
+
+import database
+import migrate
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    database.configure_sqlite(engine, database.profile)
+    yield engine
+    engine.dispose()
+
+
+def test_router_queries_use_their_indexes(engine):
+    assert migrate.upgrade(engine) == sorted(version for version, _, _ in migrate.MIGRATIONS)
+    assert migrate.check_query_plans(engine) == []
+
+
+def test_upgrade_is_idempotent(engine):
+    migrate.upgrade(engine)
+    assert migrate.upgrade(engine) == []
+    with engine.connect() as conn:
+        assert migrate.current_version(conn) == migrate.latest_version()
+
+
+def test_missing_index_is_reported(engine):
+    migrate.upgrade(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_attempts_user_recent")
+    failures = {name for name, _, _ in migrate.check_query_plans(engine)}
+    assert {"history", "history_next_page"} <= failures
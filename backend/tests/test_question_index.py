@@ -0,0 +1,180 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+import migrate
+import models
+import question_index
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "app.db"
+    engine = create_engine(f"sqlite:///{path}")
+    migrate.upgrade(engine)
+    with Session(engine) as db:
+        db.add_all(models.Question(source="OlymMATH", external_id=str(i), problem=f"problem {i}", difficulty=i % 3)
+                   for i in range(5))
+        db.commit()
+    engine.dispose()
+    return path
+
+
+def counting_rebuilds(index):
+    calls = []
+    rebuild = index.rebuild
+
+    def counted(db):
+        calls.append(db)
+        rebuild(db)
+
+    index.rebuild = counted
+    return calls
+
+
+def test_concurrent_refresh_rebuilds_once(db_path):
+    index = question_index.QuestionIndex()
+    rebuilds = counting_rebuilds(index)
+
+    async def request(engine):
+        async with AsyncSession(engine) as db:
+            await index.refresh(db)
+            return len(index)
+
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        try:
+            return await asyncio.gather(*(request(engine) for _ in range(10)))
+        finally:
+            await engine.dispose()
+
+    # Every request waits for the first load, and only one of them runs it
+    assert asyncio.run(main()) == [5] * 10
+    assert len(rebuilds) == 1
+
+
+def test_refresh_does_not_wait_once_loaded(db_path):
+    index = question_index.QuestionIndex()
+
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        try:
+            async with AsyncSession(engine) as db:
+                await index.refresh(db)
+                index._checked_at = 0.0
+                async with index._async_syncing[1]:
+                    # Another request is syncing: use the index as it is
+                    await asyncio.wait_for(index.refresh(db), 1)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+    assert len(index) == 5
+
+
+def test_edit_during_sync_forces_rebuild(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    index = question_index.QuestionIndex()
+    with Session(engine) as db:
+        index.sync(db)
+        index._checked_at = 0.0
+        read_fingerprint = index._read_fingerprint
+
+        def racing_put(db, max_id):
+            index.put(1000, "OlymMATH", 1, True)  # Not in the database
+            return read_fingerprint(db, max_id)
+
+        index._read_fingerprint = racing_put
+        index.sync(db)
+        assert 1000 in index._keys
+        index._read_fingerprint = read_fingerprint
+
+        rebuilds = counting_rebuilds(index)
+        index.sync(db)
+        assert len(rebuilds) == 1
+        assert 1000 not in index._keys and len(index) == 5
+    engine.dispose()
+
+
+def set_clusters(db, labels):
+    for question_id, cluster_id in labels.items():
+        db.get(models.Question, question_id).cluster_id = cluster_id
+    db.commit()
+
+
+def test_merge_relabels_older_rows(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    index = question_index.QuestionIndex()
+    with Session(engine) as db:
+        set_clusters(db, {1: 1, 2: 1, 3: 3, 4: 3})
+        index.sync(db)
+        assert index._clusters == {2: 1, 4: 3}
+
+        # A new question joins both clusters, and the importer relabels 3's members
+        db.add(models.Question(source="OlymMATH", external_id="5", problem="problem 5", difficulty=0))
+        db.flush()
+        set_clusters(db, {3: 1, 4: 1, 6: 1})
+        index._checked_at = 0.0
+        index.sync(db)
+        assert index._clusters == {2: 1, 3: 1, 4: 1, 6: 1}
+        sample = index.sample(6)
+        assert len(sample) == 2 and 5 in sample
+
+        # Relabelled with no new rows, e.g. by near_duplicates.py rebuild
+        rebuilds = counting_rebuilds(index)
+        set_clusters(db, {3: 3, 4: 3})
+        index._checked_at = 0.0
+        index.sync(db)
+        assert index._clusters == {2: 1, 4: 3, 6: 1}
+        assert not rebuilds
+    engine.dispose()
+
+
+def tag(db, question_id, *topic_ids, origin="import"):
+    db.add_all(models.QuestionTopic(question_id=question_id, topic_id=t, origin=origin) for t in topic_ids)
+    db.commit()
+
+
+def test_retagging_is_picked_up(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    index = question_index.QuestionIndex()
+    with Session(engine) as db:
+        db.add_all([models.Topic(id=1, slug="algebra", name="Algebra"), models.Topic(id=2, slug="geometry", name="Geometry")])
+        tag(db, 1, 1)
+        tag(db, 2, 2)
+        index.sync(db)
+        assert sorted(index.candidate_ids(topics=["algebra"])) == [1]
+        rebuilds = counting_rebuilds(index)
+
+        # Another process re-tags loaded questions: swap their topics
+        db.query(models.QuestionTopic).delete()
+        tag(db, 1, 2)
+        tag(db, 2, 1)
+        index._checked_at = 0.0
+        index.sync(db)
+        assert sorted(index.candidate_ids(topics=["algebra"])) == [2]
+
+        # A new question with a topic and a re-tag of an old one, in one import
+        db.add(models.Question(source="OlymMATH", external_id="5", problem="problem 5", difficulty=0))
+        db.flush()
+        tag(db, 6, 1)
+        tag(db, 3, 1, origin="curriculum")
+        index._checked_at = 0.0
+        index.sync(db)
+        assert sorted(index.candidate_ids(topics=["algebra"])) == [2, 3, 6]
+
+        # New questions' links alone do not reload every link
+        reloads = []
+        reload_topics = index._reload_topics
+        index._reload_topics = lambda db: (reloads.append(db), reload_topics(db))
+        db.add(models.Question(source="OlymMATH", external_id="6", problem="problem 6", difficulty=0))
+        db.flush()
+        tag(db, 7, 2)
+        index._checked_at = 0.0
+        index.sync(db)
+        assert sorted(index.candidate_ids(topics=["geometry"])) == [1, 7]
+        assert not reloads and not rebuilds
+    engine.dispose()
@@ -0,0 +1,82 @@
+import io
+
+import pyarrow as pa
+import pytest
+from PIL import Image
+
+import snapshots
+
+
+def write_fixture(filename, items, batch_rows):
+    with pa.OSFile(filename, "wb") as sink, pa.ipc.new_file(sink, snapshots.SCHEMA) as writer:
+        for start in range(0, len(items), batch_rows):
+            encoded = [snapshots.encode(item) for item in items[start:start + batch_rows]]
+            records = [record for record, _ in encoded]
+            images = [item_images for _, item_images in encoded]
+            writer.write_batch(pa.record_batch([records, images], schema=snapshots.SCHEMA))
+
+
+def png(color):
+    image = Image.new("RGB", (2, 2), color)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    items = [{"problem": f"problem {i}", "answer": i} for i in range(7)]
+    filename = str(tmp_path / "fixture.arrow")
+    write_fixture(filename, items, batch_rows=3)  # batches of 3, 3 and 1 rows
+    return snapshots.Snapshot(filename), items
+
+
+def test_iterates_every_record(snapshot):
+    snap, items = snapshot
+    assert list(snap) == items
+    assert len(snap) == 7
+
+
+@pytest.mark.parametrize("n", [0, 2, 3, 4, 6, 7, 9])
+def test_skip_across_batches(snapshot, n):
+    snap, items = snapshot
+    skipped = snap.skip(n)
+    assert list(skipped) == items[n:]
+    assert len(skipped) == len(items[n:])
+
+
+def test_skip_is_cumulative(snapshot):
+    snap, items = snapshot
+    assert list(snap.skip(2).skip(2)) == items[4:]
+
+
+def test_image_round_trip(tmp_path):
+    image = png((255, 0, 0))
+    filename = str(tmp_path / "images.arrow")
+    write_fixture(filename, [{"problem": "see image", "image": image}, {"problem": "no image"}], batch_rows=1)
+
+    first, second = snapshots.Snapshot(filename)
+    assert first["problem"] == "see image"
+    assert first["image"].size == (2, 2)
+    assert first["image"].convert("RGB").getpixel((0, 0)) == (255, 0, 0)
+    assert second == {"problem": "no image"}
+
+    # The stored bytes are the PNG encode() produced
+    stored = pa.ipc.open_file(pa.memory_map(filename, "r")).get_batch(0).column("images")[0].as_py()
+    assert stored[0]["field"] == "image"
+    assert stored[0]["png"] == snapshots.encode({"image": image})[1][0]["png"]
+
+
+def test_load_dataset_reads_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", str(tmp_path))
+    write_fixture(snapshots.snapshot_path("org/data", None, "test"), [{"problem": "x"}], batch_rows=1)
+    dataset = snapshots.load_dataset("org/data", split="test", streaming=True)
+    assert isinstance(dataset, snapshots.Snapshot)
+    assert list(dataset) == [{"problem": "x"}]
+
+
+def test_snapshot_only_missing_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(snapshots, "SNAPSHOT_ONLY", True)
+    with pytest.raises(FileNotFoundError, match="No snapshot for org/missing"):
+        snapshots.load_dataset("org/missing", "cfg", split="train", streaming=True)
@@ -0,0 +1,227 @@
+"""
+Normalized topics for questions.
+
+Question.topic is free text as the datasets provide it ("Math", "Coding/Math",
+OlympiadBench subfields such as "Number Theory"). Each value is split into
+topics and each topic is reduced to a slug ("Number Theory" and "NT" both
+become number-theory), stored once in topics and linked to questions through
+question_topics. Links carry an origin: "import" for the dataset's own
+subject, kept in step by the importer, and "curriculum" for the concepts
+curriculum_generator found for the problem.
+
+    python topic_taxonomy.py backfill           # (re)tag every question from Question.topic
+    python topic_taxonomy.py concepts [PATH]    # link questions to curriculum concepts
+    python topic_taxonomy.py list
+"""
+import argparse
+import os
+import re
+import sqlite3
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import curriculum_store
+import models
+
+IMPORT = "import"
+CURRICULUM = "curriculum"
+BATCH_SIZE = 2000
+
+SEPARATORS = re.compile(r"[/,;|]")
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+ALIASES = {
+    "math": "mathematics",
+    "maths": "mathematics",
+    "nt": "number-theory",
+    "combinatorial": "combinatorics",
+    "counting": "combinatorics",
+    "probabilities": "probability",
+    "inequality": "inequalities",
+    "geometric": "geometry",
+    "coding": "programming",
+    "code": "programming",
+}
+
+
+def slugify(name):
+    return NON_ALNUM.sub("-", name.lower()).strip("-")
+
+
+def parse_topics(value):
+    """
+    Split a free-text topic value (or a list of them) into [(slug, name)],
+    without duplicates.
+    """
+    if not value:
+        return []
+    parts = value if isinstance(value, (list, tuple)) else SEPARATORS.split(value)
+    topics = {}
+    for part in parts:
+        name = " ".join(str(part).split())
+        slug = slugify(name)
+        if not slug:
+            continue
+        if slug in ALIASES:
+            slug = ALIASES[slug]
+            name = slug.replace("-", " ").title()
+        topics.setdefault(slug, name)
+    return list(topics.items())
+
+
+def ensure_topics(db, topics):
+    """
+    Insert any missing topics from [(slug, name)] and return {slug: id}.
+    """
+    names = {}
+    for slug, name in topics:
+        names.setdefault(slug, name)
+    topics = names
+    if not topics:
+        return {}
+    db.execute(
+        sqlite_insert(models.Topic).on_conflict_do_nothing(index_elements=["slug"]),
+        [{"slug": slug, "name": name} for slug, name in topics.items()],
+    )
+    ids = {}
+    slugs = list(topics)
+    for start in range(0, len(slugs), 500):
+        ids.update(db.execute(
+            select(models.Topic.slug, models.Topic.id).where(models.Topic.slug.in_(slugs[start:start + 500]))
+        ).all())
+    return ids
+
+
+def set_topics(db, values, origin=IMPORT):
+    """
+    Replace the `origin` links of the questions in values ({question_id:
+    topic value}) in the caller's transaction.
+    """
+    parsed = {qid: parse_topics(value) for qid, value in values.items()}
+    ids = list(parsed)
+    for start in range(0, len(ids), 500):
+        db.execute(delete(models.QuestionTopic).where(
+            models.QuestionTopic.origin == origin,
+            models.QuestionTopic.question_id.in_(ids[start:start + 500]),
+        ))
+    topic_ids = ensure_topics(db, [topic for topics in parsed.values() for topic in topics])
+    links = [
+        {"question_id": qid, "topic_id": topic_ids[slug], "origin": origin}
+        for qid, topics in parsed.items()
+        for slug, _ in topics
+    ]
+    if links:
+        db.execute(insert(models.QuestionTopic), links)
+    return len(links)
+
+
+def remove_questions(db, ids=None):
+    """
+    Drop the links of the given questions, or of every question if ids is None.
+    """
+    if ids is None:
+        db.execute(delete(models.QuestionTopic))
+        return
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        db.execute(delete(models.QuestionTopic).where(models.QuestionTopic.question_id.in_(ids[start:start + 500])))
+
+
+def backfill(db, batch_size=BATCH_SIZE):
+    """
+    Tag every question from its topic column. Returns the number of links.
+    """
+    links = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(models.Question.id, models.Question.topic)
+            .where(models.Question.id > last_id)
+            .order_by(models.Question.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return links
+        links += set_topics(db, dict(rows))
+        last_id = rows[-1][0]
+
+
+def link_concepts(db, path=curriculum_store.DB_PATH, batch_size=BATCH_SIZE):
+    """
+    Replace the curriculum links with the concepts generated for each
+    question's problem, matched on the hash of its text. Returns the number
+    of links.
+    """
+    curriculum = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        concepts = {}
+        for problem_hash, name in curriculum.execute(
+            "SELECT DISTINCT p.problem_hash, c.name FROM problems p"
+            " JOIN sub_problems s ON s.problem_id = p.id"
+            " JOIN concept_sub_problems cs ON cs.sub_problem_id = s.id"
+            " JOIN concepts c ON c.id = cs.concept_id"
+        ):
+            concepts.setdefault(problem_hash, []).append(name)
+    finally:
+        curriculum.close()
+
+    db.execute(delete(models.QuestionTopic).where(models.QuestionTopic.origin == CURRICULUM))
+    links = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(models.Question.id, models.Question.problem)
+            .where(models.Question.id > last_id, models.Question.problem.isnot(None))
+            .order_by(models.Question.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return links
+        matched = {
+            qid: concepts[digest]
+            for qid, problem in rows
+            if (digest := curriculum_store.problem_hash(problem)) in concepts
+        }
+        if matched:
+            links += set_topics(db, matched, origin=CURRICULUM)
+        last_id = rows[-1][0]
+
+
+def topic_counts(db):
+    return db.execute(
+        select(models.Topic.slug, models.Topic.name, func.count(models.QuestionTopic.question_id))
+        .join(models.QuestionTopic, models.QuestionTopic.topic_id == models.Topic.id)
+        .group_by(models.Topic.id)
+        .order_by(func.count(models.QuestionTopic.question_id).desc())
+    ).all()
+
+
+def main():
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backfill", help="tag every question from Question.topic")
+    concepts = commands.add_parser("concepts", help="link questions to curriculum concepts")
+    concepts.add_argument("path", nargs="?", default=curriculum_store.DB_PATH)
+    commands.add_parser("list", help="show topics and question counts")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "backfill":
+            print(f"Added {backfill(db)} topic links")
+        elif args.command == "concepts":
+            if not os.path.exists(args.path):
+                parser.error(f"{args.path} not found; run curriculum_generator/aggregate.py")
+            print(f"Added {link_concepts(db, args.path)} concept links")
+        else:
+            for slug, name, count in topic_counts(db):
+                print(f"{count:>8}  {slug:<32} {name}")
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
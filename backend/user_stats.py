@@ -0,0 +1,131 @@
+"""
+Incrementally maintained attempt rollups backing GET /users/{id}/stats.
+"""
+from collections import defaultdict
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+import models
+
+
+def _upsert(increments):
+    stmt = insert(models.UserStat).values(increments)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "source", "difficulty"],
+        set_={
+            "attempts": models.UserStat.attempts + stmt.excluded.attempts,
+            "correct": models.UserStat.correct + stmt.excluded.correct,
+            "time_taken": models.UserStat.time_taken + stmt.excluded.time_taken,
+        },
+    )
+
+
+async def apply_attempts(db, attempts):
+    """
+    Add new attempts to the rollups. Runs in the caller's transaction so the
+    totals commit together with the attempts.
+    """
+    question_ids = {a.question_id for a in attempts}
+    rows = await db.execute(
+        select(models.Question.id, models.Question.source, models.Question.difficulty)
+        .where(models.Question.id.in_(question_ids))
+    )
+    groups = {qid: (source or "", difficulty or 0) for qid, source, difficulty in rows}
+
+    totals = defaultdict(lambda: [0, 0, 0])
+    for a in attempts:
+        source, difficulty = groups.get(a.question_id, ("", 0))
+        t = totals[(a.user_id, source, difficulty)]
+        t[0] += 1
+        t[1] += 1 if a.is_correct else 0
+        t[2] += a.time_taken or 0
+
+    if totals:
+        await db.execute(_upsert([
+            {
+                "user_id": user_id,
+                "source": source,
+                "difficulty": difficulty,
+                "attempts": n,
+                "correct": correct,
+                "time_taken": time_taken,
+            }
+            for (user_id, source, difficulty), (n, correct, time_taken) in totals.items()
+        ]))
+
+
+def rebuild(db):
+    """
+    Recompute all rollups from the attempts table (sync session). The caller
+    commits.
+    """
+    db.query(models.UserStat).delete()
+    grouped = (
+        db.query(
+            models.Attempt.user_id,
+            func.coalesce(models.Question.source, ""),
+            func.coalesce(models.Question.difficulty, 0),
+            func.count(models.Attempt.id),
+            func.sum(case((models.Attempt.is_correct == True, 1), else_=0)),
+            func.sum(func.coalesce(models.Attempt.time_taken, 0)),
+        )
+        .outerjoin(models.Question, models.Question.id == models.Attempt.question_id)
+        .filter(models.Attempt.user_id.isnot(None))
+        .group_by(models.Attempt.user_id, models.Question.source, models.Question.difficulty)
+        .all()
+    )
+    for user_id, source, difficulty, n, correct, time_taken in grouped:
+        db.add(models.UserStat(
+            user_id=user_id,
+            source=source,
+            difficulty=difficulty,
+            attempts=n,
+            correct=correct or 0,
+            time_taken=time_taken or 0,
+        ))
+
+
+def needs_rebuild(db):
+    has_attempts = db.query(models.Attempt.id).first() is not None
+    has_stats = db.query(models.UserStat.id).first() is not None
+    return has_attempts and not has_stats
+
+
+async def get_stats(db, user_id):
+    rows = (await db.scalars(
+        select(models.UserStat)
+        .where(models.UserStat.user_id == user_id)
+        .order_by(models.UserStat.source, models.UserStat.difficulty)
+    )).all()
+
+    def accuracy(correct, attempts):
+        return round(correct / attempts, 4) if attempts else 0.0
+
+    by_source = defaultdict(lambda: [0, 0])
+    groups = []
+    for r in rows:
+        groups.append({
+            "source": r.source or None,
+            "difficulty": r.difficulty or None,
+            "attempts": r.attempts,
+            "correct": r.correct,
+            "accuracy": accuracy(r.correct, r.attempts),
+        })
+        by_source[r.source][0] += r.attempts
+        by_source[r.source][1] += r.correct
+
+    total = sum(r.attempts for r in rows)
+    correct = sum(r.correct for r in rows)
+    return {
+        "user_id": user_id,
+        "total_attempts": total,
+        "correct": correct,
+        "accuracy": accuracy(correct, total),
+        "time_taken": sum(r.time_taken for r in rows),
+        "by_source": [
+            {"source": source or None, "difficulty": None, "attempts": n, "correct": c, "accuracy": accuracy(c, n)}
+            for source, (n, c) in sorted(by_source.items())
+        ],
+        "by_source_difficulty": groups,
+    }
@@ -14,6 +14,8 @@ export interface Question {
     external_id: string;
     problem: string;
     image_path?: string;
+    image_width?: number;
+    image_height?: number;
     solution?: string;
     answer?: string;
     topic?: string;
@@ -21,6 +23,7 @@ export interface Question {
     options?: string[];
     correct_option_label?: string;
     is_active: boolean;
+    cluster_id?: number;
 }
 
 // Removed unused PDF functions
@@ -32,11 +35,23 @@ export const createSession = async (config: {
     user_id?: number;
     mode?: 'practice' | 'challenge';
     source?: string;
+    topics?: string[];
 }) => {
     const response = await api.post<Question[]>('/sessions', config);
     return response.data;
 };
 
+export interface Topic {
+    slug: string;
+    name: string;
+    questions: number;
+}
+
+export const getTopics = async () => {
+    const response = await api.get<Topic[]>('/topics');
+    return response.data;
+};
+
 export const getQuestions = async (activeOnly: boolean = false) => {
     const params: any = { active_only: activeOnly };
     const response = await api.get<Question[]>('/questions', { params });
@@ -55,13 +70,19 @@ export const getHint = async (questionText: string) => {
     return response.data.hint;
 };
 
-export const streamHint = async (questionText: string, onChunk: (chunk: string) => void) => {
+export const streamHint = async (questionText: string, onChunk: (chunk: string) => void, signal?: AbortSignal) => {
+    // Aborting the signal closes the connection, which cancels the generation on the server
     const response = await fetch(`${API_URL}/hint/stream`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ question_text: questionText })
+        body: JSON.stringify({ question_text: questionText }),
+        signal
     });
 
+    if (response.status === 503) {
+        onChunk('The hint service is busy right now. Please try again in a moment.');
+        return;
+    }
     if (!response.body) return;
     const reader = response.body.getReader();
     const decoder = new TextDecoder();
@@ -69,10 +90,44 @@ export const streamHint = async (questionText: string, onChunk: (chunk: string)
     while (true) {
         const { done, value } = await reader.read();
         if (done) break;
-        onChunk(decoder.decode(value));
+        onChunk(decoder.decode(value, { stream: true }));
     }
 };
 
+export interface StatsGroup {
+    source?: string;
+    difficulty?: number;
+    attempts: number;
+    correct: number;
+    accuracy: number;
+}
+
+export interface UserStats {
+    user_id: number;
+    total_attempts: number;
+    correct: number;
+    accuracy: number;
+    time_taken: number;
+    by_source: StatsGroup[];
+    by_source_difficulty: StatsGroup[];
+}
+
+export const getUserStats = async (userId: number) => {
+    const response = await api.get<UserStats>(`/users/${userId}/stats`);
+    return response.data;
+};
+
+export const getUserHistory = async <T,>(userId: number, params: {
+    limit?: number;
+    before_id?: string;
+    since?: string;
+    until?: string;
+    is_correct?: boolean;
+}) => {
+    const response = await api.get<T[]>(`/users/${userId}/history`, { params });
+    return { items: response.data, nextCursor: response.headers['x-next-cursor'] as string | undefined };
+};
+
 export const uploadAvatar = async (userId: number, file: File) => {
     const formData = new FormData();
     formData.append('file', file);
@@ -81,3 +136,67 @@ export const uploadAvatar = async (userId: number, file: File) => {
     });
     return response.data.avatar_url;
 };
+
+export interface Concept {
+    id: number;
+    name: string;
+    sub_problems: number;
+    problems: number;
+}
+
+export interface SubProblem {
+    id: number;
+    position: number;
+    question?: string;
+    answer?: string;
+    concept?: string;
+    parent_problem_id?: number;
+    key_insight?: string;
+}
+
+export interface Page<T> {
+    total: number;
+    skip: number;
+    limit: number;
+    items: T[];
+}
+
+export interface ConceptLadder {
+    question_id: number;
+    key_insight?: string;
+    concepts: { id: number; name: string }[];
+    steps: SubProblem[];
+}
+
+export const getConcepts = async (skip: number = 0, limit: number = 50) => {
+    const response = await api.get<Page<Concept>>('/concepts', { params: { skip, limit } });
+    return response.data;
+};
+
+export const getConceptSubProblems = async (conceptId: number, skip: number = 0, limit: number = 50) => {
+    const response = await api.get<Page<SubProblem> & { concept: { id: number; name: string } }>(`/concepts/${conceptId}`, { params: { skip, limit } });
+    return response.data;
+};
+
+export const getQuestionLadder = async (questionId: number) => {
+    const response = await api.get<ConceptLadder>(`/concepts/questions/${questionId}/ladder`);
+    return response.data;
+};
+
+export interface SearchResult {
+    kind: 'question' | 'sub_problem';
+    id: number;
+    score: number;
+    snippet: string;
+    source?: string;
+    difficulty?: number;
+    topic?: string;
+    question?: string;
+    answer?: string;
+    concepts?: string;
+}
+
+export const search = async (q: string, options: { kind?: 'question' | 'sub_problem'; skip?: number; limit?: number; prefix?: boolean } = {}) => {
+    const response = await api.get<SearchResult[]>('/search', { params: { q, ...options } });
+    return response.data;
+};
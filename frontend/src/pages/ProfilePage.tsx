@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useUser } from '../context/UserContext';
-import { uploadAvatar } from '../api';
+import { uploadAvatar, getUserStats, getUserHistory, UserStats } from '../api';
 import { CheckCircle, XCircle, Calendar, Filter, ArrowLeft, Camera, User as UserIcon } from 'lucide-react';
 import { Link } from 'react-router-dom';
 import ReactMarkdown from 'react-markdown';
@@ -26,29 +26,52 @@ interface Attempt {
 export const ProfilePage: React.FC = () => {
     const { user, setUser } = useUser();
     const [attempts, setAttempts] = useState<Attempt[]>([]);
+    const [stats, setStats] = useState<UserStats | null>(null);
+    const [nextCursor, setNextCursor] = useState<string | undefined>();
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [filterStatus, setFilterStatus] = useState<'all' | 'correct' | 'incorrect'>('all');
     const [filterDate, setFilterDate] = useState<string>('');
 
     useEffect(() => {
-        const fetchHistory = async () => {
-            if (!user) return;
-            try {
-                const response = await fetch(`http://localhost:8000/users/${user.id}/history`);
-                const data = await response.json();
-                // Sort by timestamp desc
-                data.sort((a: Attempt, b: Attempt) => new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime());
-                setAttempts(data);
-            } catch (error) {
-                console.error('Failed to fetch history:', error);
-            } finally {
-                setLoading(false);
-            }
-        };
-
-        fetchHistory();
+        if (!user) return;
+        getUserStats(user.id)
+            .then(setStats)
+            .catch(error => console.error('Failed to fetch stats:', error));
     }, [user]);
 
+    // History is paged and filtered on the server, newest first
+    const fetchHistory = async (cursor?: string) => {
+        if (!user) return;
+        const params: Parameters<typeof getUserHistory>[1] = { limit: 50, before_id: cursor };
+        if (filterStatus !== 'all') params.is_correct = filterStatus === 'correct';
+        if (filterDate) {
+            params.since = `${filterDate}T00:00:00`;
+            params.until = `${filterDate}T23:59:59.999`;
+        }
+        const page = await getUserHistory<Attempt>(user.id, params);
+        setAttempts(prev => cursor ? [...prev, ...page.items] : page.items);
+        setNextCursor(page.nextCursor);
+    };
+
+    useEffect(() => {
+        setLoading(true);
+        fetchHistory()
+            .catch(error => console.error('Failed to fetch history:', error))
+            .finally(() => setLoading(false));
+    }, [user, filterStatus, filterDate]);
+
+    const loadMore = async () => {
+        setLoadingMore(true);
+        try {
+            await fetchHistory(nextCursor);
+        } catch (error) {
+            console.error('Failed to fetch history:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     if (!user) {
         return (
             <div className="min-h-screen flex items-center justify-center bg-gray-50">
@@ -57,20 +80,6 @@ export const ProfilePage: React.FC = () => {
         );
     }
 
-    const filteredAttempts = attempts.filter(attempt => {
-        // Status Filter
-        if (filterStatus === 'correct' && !attempt.is_correct) return false;
-        if (filterStatus === 'incorrect' && attempt.is_correct) return false;
-
-        // Date Filter (YYYY-MM-DD from input matches timestamp)
-        if (filterDate) {
-            const attemptDate = new Date(attempt.timestamp).toISOString().split('T')[0];
-            if (attemptDate !== filterDate) return false;
-        }
-
-        return true;
-    });
-
     const formatDate = (isoString: string) => {
         return new Date(isoString).toLocaleDateString('en-US', {
             day: 'numeric',
@@ -152,20 +161,18 @@ export const ProfilePage: React.FC = () => {
                 <div className="grid grid-cols-1 md:grid-cols-3 gap-4 mb-8">
                     <div className="bg-white p-6 rounded-2xl shadow-sm border border-gray-200">
                         <p className="text-gray-500 font-medium">Total Attempts</p>
-                        <p className="text-3xl font-bold text-gray-900">{attempts.length}</p>
+                        <p className="text-3xl font-bold text-gray-900">{stats?.total_attempts ?? 0}</p>
                     </div>
                     <div className="bg-white p-6 rounded-2xl shadow-sm border border-gray-200">
                         <p className="text-gray-500 font-medium">Correct Answers</p>
                         <p className="text-3xl font-bold text-green-600">
-                            {attempts.filter(a => a.is_correct).length}
+                            {stats?.correct ?? 0}
                         </p>
                     </div>
                     <div className="bg-white p-6 rounded-2xl shadow-sm border border-gray-200">
                         <p className="text-gray-500 font-medium">Accuracy</p>
                         <p className="text-3xl font-bold text-blue-600">
-                            {attempts.length > 0
-                                ? Math.round((attempts.filter(a => a.is_correct).length / attempts.length) * 100)
-                                : 0}%
+                            {Math.round((stats?.accuracy ?? 0) * 100)}%
                         </p>
                     </div>
                 </div>
@@ -214,12 +221,12 @@ export const ProfilePage: React.FC = () => {
                             <div className="animate-spin rounded-full h-8 w-8 border-b-2 border-indigo-600 mx-auto mb-4"></div>
                             <p className="text-gray-500">Loading history...</p>
                         </div>
-                    ) : filteredAttempts.length === 0 ? (
+                    ) : attempts.length === 0 ? (
                         <div className="text-center py-12 bg-white rounded-2xl border border-gray-200 border-dashed">
                             <p className="text-gray-500">No attempts found matching your filters.</p>
                         </div>
                     ) : (
-                        filteredAttempts.map((attempt) => (
+                        attempts.map((attempt) => (
                             <div key={attempt.id} className="bg-white p-6 rounded-2xl shadow-sm border border-gray-200 hover:shadow-md transition">
                                 <div className="flex justify-between items-start mb-4">
                                     <div className="flex items-center gap-3">
@@ -271,6 +278,15 @@ export const ProfilePage: React.FC = () => {
                             </div>
                         ))
                     )}
+                    {!loading && nextCursor && (
+                        <button
+                            onClick={loadMore}
+                            disabled={loadingMore}
+                            className="w-full py-3 text-indigo-600 font-medium bg-white rounded-2xl border border-gray-200 hover:bg-indigo-50 transition disabled:opacity-50"
+                        >
+                            {loadingMore ? 'Loading...' : 'Load more'}
+                        </button>
+                    )}
                 </div>
             </div>
         </div>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Question, streamHint } from '../api';
 import { CheckCircle, XCircle, ArrowRight, RefreshCw, Home, HelpCircle, Trophy, Clock, Lightbulb, SkipForward, Loader } from 'lucide-react';
@@ -62,6 +62,12 @@ export const Quiz: React.FC = () => {
     // Hint State
     const [hint, setHint] = useState<string | null>(null);
     const [loadingHint, setLoadingHint] = useState(false);
+    const hintRequest = useRef<AbortController | null>(null);
+
+    // Stop streaming a hint nobody will read
+    useEffect(() => {
+        return () => hintRequest.current?.abort();
+    }, [currentIndex]);
 
     // Time Tracking
     const [questionStartTime, setQuestionStartTime] = useState<number>(Date.now());
@@ -155,16 +161,22 @@ export const Quiz: React.FC = () => {
         if (hint) return;
         setLoadingHint(true);
         setHint(""); // Initialize with empty string to show the panel
+        const controller = new AbortController();
+        hintRequest.current = controller;
         try {
             const text = currentQuestion.problem || "Please help me with this math problem.";
             await streamHint(text, (chunk) => {
                 setHint(prev => (prev || "") + chunk);
-            });
+            }, controller.signal);
         } catch (error) {
+            if (controller.signal.aborted) return;
             console.error("Failed to get hint", error);
             setHint("Sorry, could not generate a hint. Is Ollama running?");
         } finally {
-            setLoadingHint(false);
+            if (hintRequest.current === controller) {
+                hintRequest.current = null;
+                setLoadingHint(false);
+            }
         }
     };
 
@@ -299,8 +311,10 @@ export const Quiz: React.FC = () => {
                             <div className="mt-6 flex justify-center">
                                 <img
                                     src={`http://localhost:8000${currentQuestion.image_path}`}
+                                    width={currentQuestion.image_width}
+                                    height={currentQuestion.image_height}
                                     alt="Question"
-                                    className="max-w-full max-h-[400px] object-contain rounded-lg shadow-sm border border-gray-100"
+                                    className="max-w-full h-auto max-h-[400px] object-contain rounded-lg shadow-sm border border-gray-100"
                                 />
                             </div>
                         )}